@@ -1,15 +1,208 @@
 import pandas as pd
+import numpy as np
+import datetime as dt
 from dataclasses import dataclass
+from typing import Dict, TYPE_CHECKING
+import weakref
+import os
 
+if TYPE_CHECKING:
+    from ifonly.history.standings import StandingsSketch
 
-@dataclass
-class Contest:
-    details: pd.Series
+
+@dataclass(slots=True, weakref_slot=True)
+class DayBundle:
+    """
+    Everything read for a single day, shared by all of that day's contests
+
+    `draftables`, `payouts` and `standings` are sorted by draft group or contest so each contest's rows are a
+    contiguous block, and the `*_offsets` frames hold the start and stop of each block
+
+    When standings are sketched, `standings` is None and `standing_offsets` still holds the blocks the full standings
+    would have had
+    """
+
+    date: dt.datetime
+    contests_details: pd.DataFrame
+    competitions: pd.DataFrame
+    draft_groups: pd.DataFrame
+    draft_group_games: pd.DataFrame
     draftables: pd.DataFrame
-    draft_group: pd.Series
+    draftable_offsets: pd.DataFrame
+    projections: np.ndarray  # contest projections, aligned with `draftables` and filled in one draft group at a time
+    projection_table: pd.DataFrame
     lineup_reqs: pd.Series
-    max_entries: int
+    max_entries: pd.Series
     payouts: pd.DataFrame
-    projections: pd.Series
-    standings: pd.DataFrame  # TODO: hide standings so lineup generator can't see
-    box_scores: pd.DataFrame  # TODO: hide box scores so lineup generator can't see
+    payout_offsets: pd.DataFrame
+    standings: pd.DataFrame | None
+    standing_offsets: pd.DataFrame
+    box_scores: pd.DataFrame
+    standings_sketches: Dict[int, "StandingsSketch"] | None = None
+    # each draftable's features as of the start of the day, aligned with `draftables`
+    features: pd.DataFrame | None = None
+    key: str | None = None  # what contests pickled from this day find it again by, set by `register_day`
+
+
+# the days of this process that pickled contests can be unpickled into, by key
+_days: "weakref.WeakValueDictionary[str, DayBundle]" = weakref.WeakValueDictionary()
+
+
+def register_day(day: DayBundle, key: str | None = None) -> str:
+    """Registers `day` under `key`, or a key only this process knows, so contests of it can be unpickled"""
+    day.key = key or f"{os.getpid()}-{day.date:%Y-%m-%d}-{id(day):x}"
+    _days[day.key] = day
+    return day.key
+
+
+def resolve_day(key: str) -> DayBundle:
+    """Returns the day registered under `key`, attaching to it if it's a day another process shared"""
+    if key in _days:
+        return _days[key]
+
+    # imported here since sharing days depends on this module
+    from ifonly.history.shared import attach_day
+
+    try:
+        return attach_day(key)
+    except (FileNotFoundError, ValueError):
+        raise LookupError(
+            f"Day {key} isn't loaded in this process or shared, a contest can only be unpickled where its day is"
+        ) from None
+
+
+class Contest:
+    """
+    A lightweight view of one contest in a `DayBundle`
+
+    The contest only stores ids and offsets into the bundle, the pandas objects algorithms use are materialised the
+    first time they're accessed and aren't pickled. Neither is the bundle, a contest is unpickled into the bundle its
+    process registered under the same key (see `register_day`)
+    """
+
+    __slots__ = (
+        "day",
+        "contest_id",
+        "draft_group_id",
+        "contest_type_id",
+        "max_entries",
+        "draftables_start",
+        "draftables_stop",
+        "payouts_start",
+        "payouts_stop",
+        "standings_start",
+        "standings_stop",
+        "_materialised",
+    )
+
+    def __init__(self, day: DayBundle, contest_id: int, draft_group_id: int, contest_type_id: int, max_entries: int):
+        self.day = day
+        self.contest_id = contest_id
+        self.draft_group_id = draft_group_id
+        self.contest_type_id = contest_type_id
+        self.max_entries = max_entries
+        self.draftables_start, self.draftables_stop = map(int, day.draftable_offsets.loc[draft_group_id])
+        self.payouts_start, self.payouts_stop = map(int, day.payout_offsets.loc[contest_id])
+        self.standings_start, self.standings_stop = map(int, day.standing_offsets.loc[contest_id])
+        self._materialised: dict = {}
+
+    def __getstate__(self) -> dict:
+        # the day isn't pickled along with the contest, only the key to find it again by once unpickled
+        state = {attr: getattr(self, attr) for attr in self.__slots__ if attr not in {"day", "_materialised"}}
+        state["day_key"] = self.day.key or register_day(self.day)
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        state = dict(state)
+        self.day = resolve_day(state.pop("day_key"))
+        for attr, value in state.items():
+            setattr(self, attr, value)
+        self._materialised = {}
+
+    def __repr__(self) -> str:
+        return f"Contest(contest_id={self.contest_id}, draft_group_id={self.draft_group_id}, date={self.day.date})"
+
+    def _materialise(self, name: str, build) -> pd.DataFrame | pd.Series:
+        if name not in self._materialised:
+            self._materialised[name] = build()
+        return self._materialised[name]
+
+    @property
+    def details(self) -> pd.Series:
+        return self._materialise("details", lambda: self.day.contests_details.loc[self.contest_id])
+
+    @property
+    def draft_group(self) -> pd.Series:
+        return self._materialise("draft_group", lambda: self.day.draft_groups.loc[self.draft_group_id])
+
+    @property
+    def lineup_reqs(self) -> pd.Series:
+        return self._materialise("lineup_reqs", lambda: self.day.lineup_reqs.loc[self.contest_type_id])
+
+    @property
+    def draftables(self) -> pd.DataFrame:
+        return self._materialise(
+            "draftables",
+            lambda: self.day.draftables.iloc[self.draftables_start : self.draftables_stop].droplevel("draft_group_id"),
+        )
+
+    @property
+    def projections(self) -> pd.Series:
+        return self._materialise(
+            "projections",
+            lambda: pd.Series(self.draftable_projections, index=self.draftables.index),
+        )
+
+    @property
+    def draftable_projections(self) -> np.ndarray:
+        return self.day.projections[self.draftables_start : self.draftables_stop]
+
+    @property
+    def features(self) -> pd.DataFrame | None:
+        """Each draftable's features from the games before the contest's date, None without a feature store"""
+        if self.day.features is None:
+            return None
+        return self._materialise(
+            "features",
+            lambda: self.day.features.iloc[self.draftables_start : self.draftables_stop].droplevel("draft_group_id"),
+        )
+
+    @property
+    def payouts(self) -> pd.DataFrame:
+        return self._materialise(
+            "payouts",
+            lambda: self.day.payouts.iloc[self.payouts_start : self.payouts_stop].droplevel("contest_id"),
+        )
+
+    def _get_day_standings(self) -> pd.DataFrame:
+        if self.day.standings is None:
+            raise ValueError(
+                f"The standings of contest {self.contest_id} were sketched (standings_bins > 0), only its "
+                "`standings_sketch` is available"
+            )
+        return self.day.standings
+
+    @property
+    def standings(self) -> pd.DataFrame:  # TODO: hide standings so lineup generator can't see
+        return self._materialise(
+            "standings",
+            lambda: self._get_day_standings().iloc[self.standings_start : self.standings_stop],
+        )
+
+    @property
+    def standings_points(self) -> np.ndarray:
+        return self._get_day_standings().Points.to_numpy()[self.standings_start : self.standings_stop]
+
+    @property
+    def standings_sketch(self) -> "StandingsSketch | None":
+        if self.day.standings_sketches is None:
+            return None
+        return self.day.standings_sketches[self.contest_id]
+
+    @property
+    def num_entries(self) -> int:
+        return self.standings_stop - self.standings_start
+
+    @property
+    def box_scores(self) -> pd.DataFrame:  # TODO: hide box scores so lineup generator can't see
+        return self.day.box_scores
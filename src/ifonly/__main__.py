@@ -1,16 +1,164 @@
+import time
+
+imported_at = time.perf_counter()
+
+from ifonly.utils.memory import get_process_age
 from ifonly.backtest import backtest_parallelize, backtest_sequential
+from ifonly.utils.logs import logging_listener
+from pathlib import Path
 import datetime as dt
 import pandas as pd
 import tomllib
+import argparse
 import multiprocessing
+import logging
+import os
 
-with open("ifonly.toml", "rb") as f:
-    parameters = tomllib.load(f)
+logger = logging.getLogger("ifonly")
 
-parameters["run_id"] = int(dt.datetime.now().timestamp())
-parameters["dates"] = pd.date_range(parameters["start_date"], parameters["end_date"])
 
-if __name__ == "__main__":
+def load_parameters(path: str = "ifonly.toml") -> dict:
+    with open(path, "rb") as f:
+        parameters = tomllib.load(f)
+
+    parameters["run_id"] = int(dt.datetime.now().timestamp())
+
+    # the settings `python -m ifonly tune` found for each contest type override the solver's own settings
+    for solver in parameters.get("solvers", {}).values():
+        if "tuning_file" in solver and Path(solver["tuning_file"]).exists():
+            with open(solver["tuning_file"], "rb") as f:
+                solver["contest_types"] = tomllib.load(f)
+
+    parameters["dates"] = pd.date_range(parameters["start_date"], parameters["end_date"])
+    return parameters
+
+
+def backtest(parameters: dict) -> None:
     with multiprocessing.Manager() as manager:
         backtest_func = backtest_parallelize if parameters["parallelize"] else backtest_sequential
         backtest_func(manager.Queue(), manager.Queue(), parameters)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="ifonly", description="A simulator for historical Draft Kings Contests")
+    parser.add_argument("--config", default="ifonly.toml", help="the configuration file to run with")
+    commands = parser.add_subparsers(dest="command")
+
+    commands.add_parser("backtest", help="backtest every date in the configuration on this machine (default)")
+
+    plan_parser = commands.add_parser("plan", help="enqueue a run's jobs for workers to pick up")
+    plan_parser.add_argument("--database", help="the job queue database, shared by every worker")
+    plan_parser.add_argument("--by", choices=["date", "draft_group"], default="date", help="the size of each job")
+
+    worker_parser = commands.add_parser("worker", help="run jobs from the job queue until there aren't any left")
+    worker_parser.add_argument("--database", help="the job queue database, shared by every worker")
+
+    collect_parser = commands.add_parser("collect", help="write a run's results from the job queue to results/")
+    collect_parser.add_argument("--database", help="the job queue database, shared by every worker")
+    collect_parser.add_argument("--run-id", type=int, required=True)
+
+    rejudge_parser = commands.add_parser("rejudge", help="judge the lineups stored by a previous run again")
+    rejudge_parser.add_argument("--run-id", type=int, required=True, help="the run whose lineups are judged")
+
+    tune_parser = commands.add_parser("tune", help="find the fastest solver settings for each contest type")
+    tune_parser.add_argument("--run-id", type=int, required=True, help="the run whose recorded solves are replayed")
+    tune_parser.add_argument("--solver", default="cbc", help="the solver to tune")
+
+    commands.add_parser("features", help="build or update the feature store of every season in the configuration")
+
+    bootstrap_parser = commands.add_parser("bootstrap", help="confidence intervals for the results of runs")
+    bootstrap_parser.add_argument("--run-id", type=int, nargs="+", help="the runs to analyze, the latest if omitted")
+    bootstrap_parser.add_argument("--by", nargs="*", default=[], help="columns to split each algorithm by")
+
+    serve_parser = commands.add_parser("serve", help="keep days loaded and answer queries about them over HTTP")
+    serve_parser.add_argument("--port", type=int, help="the port to listen on, the configuration's if omitted")
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    # the configuration is only read by the main process, worker processes get their parameters as arguments
+    parameters = load_parameters(args.config)
+
+    log_config = parameters.get("logging", {})
+    with logging_listener(
+        parameters["run_id"],
+        log_config.get("log_dir", "results/logs"),
+        log_config.get("level", "INFO"),
+        log_config.get("buffer_records", 1000),
+    ):
+        # measured from the start of the process, `python -m ifonly` imports the package before this module runs
+        startup = get_process_age(os.getpid())
+        if startup is None:
+            startup = time.perf_counter() - imported_at
+        log = logger.warning if startup > parameters.get("startup_budget", float("inf")) else logger.info
+        log(f"Started in {startup:.2f}s")
+
+        if args.command in {"plan", "worker", "collect"}:
+            from ifonly import jobs
+
+            queue = parameters.get("queue", {})
+            database = args.database or queue.get("database", "results/jobs.sqlite")
+
+            if args.command == "plan":
+                num_jobs = jobs.plan(database, parameters, by=args.by, results_dir=queue.get("results_dir"))
+                print(f"Planned {num_jobs} jobs for run {parameters['run_id']} in {database}")
+            elif args.command == "worker":
+                jobs.work(
+                    database,
+                    lease_seconds=queue.get("lease_seconds", 300),
+                    max_attempts=queue.get("max_attempts", 3),
+                    poll_seconds=queue.get("poll_seconds", 5),
+                )
+            else:
+                jobs.collect(database, args.run_id, parameters)
+        elif args.command == "rejudge":
+            from ifonly.backtest import rejudge
+
+            rejudge(args.run_id, parameters)
+        elif args.command == "bootstrap":
+            from ifonly.bootstrap import bootstrap_runs, compare_algorithms, load_detailed_results
+
+            results = load_detailed_results(args.run_id)
+            if args.run_id is None:
+                results = results.loc[results.run_id == results.run_id.max()]
+
+            by = ["run_id", "algorithm", *args.by]
+            settings = parameters.get("bootstrap", {})
+            with pd.option_context(
+                "display.width", 200, "display.max_columns", None, "display.float_format", "{:.4f}".format
+            ):
+                print(bootstrap_runs(results, by, **settings).to_string())
+                print(compare_algorithms(results, by, **settings).to_string())
+        elif args.command == "serve":
+            from ifonly.server import serve
+
+            server_config = parameters.get("server", {})
+            serve(
+                parameters,
+                server_config.get("host", "127.0.0.1"),
+                args.port or server_config.get("port", 8765),
+                server_config.get("cached_days", 3),
+            )
+        elif args.command == "features":
+            from ifonly.history.contests import update_feature_store
+            from ifonly.history.features import get_season
+
+            for season in sorted({get_season(date) for date in parameters["dates"]}):
+                store = update_feature_store(season)
+                if store is None:
+                    print(f"No box scores for the {season} season")
+                else:
+                    print(f"The {season} feature store holds {len(store.games)} games from {len(store.dates)} dates")
+        elif args.command == "tune":
+            from ifonly.lineups.tuning import tune, write_tuned_settings
+
+            solver = parameters["solvers"][args.solver]
+            tuned_settings = {**solver.get("contest_types", {}), **tune(args.run_id, parameters, args.solver)}
+            tuning_file = solver.get("tuning_file", f"{args.solver}_tuning.toml")
+            write_tuned_settings(tuned_settings, tuning_file)
+            print(f"Wrote the settings for {len(tuned_settings)} contest types to {tuning_file}")
+        else:
+            backtest(parameters)
@@ -1,68 +1,392 @@
 from ifonly.lineups.algorithms import CachedAlgorithm
-from ifonly.history.contests import get_contests
-from ifonly.lineups.generate import run_generation_algorithms
+from ifonly.history.contests import DayPrefetcher, get_contests, get_day_size
+from ifonly.history.shared import attach_day, shared_day
+from ifonly import Contest, DayBundle
+from ifonly.lineups.generate import prepare_generation_algorithms, run_generation_algorithms
 from ifonly.judge import get_contest_payouts
+from ifonly.counterfactual import evaluate_swaps, get_swaps_file, score_swappable_draftables
+from ifonly.lineups.store import LineupStore, get_lineups_file, get_stored_lineups, read_lineups
+from ifonly.lineups.telemetry import get_telemetry_file, pop_solve_records
 from ifonly.summarize import summarize_contest, summarize_runs
 from ifonly.utils.printer import Printer
-from ifonly.lineups import algorithms
+from ifonly.lineups import load_algorithms
+from ifonly.utils.memory import format_bytes, get_rss
+from ifonly.utils.logs import configure_worker, get_log_config, run_with_logging
 import multiprocessing
+from collections import defaultdict, deque
+from dataclasses import dataclass
 from queue import Queue
+from concurrent.futures import ProcessPoolExecutor
+from typing import Collection, Dict, List, Set, TYPE_CHECKING
+import queue
 import datetime as dt
 import pandas as pd
+import numpy as np
 import os
+import time
+import logging
 
+if TYPE_CHECKING:
+    from multiprocessing.sharedctypes import Synchronized
 
-def backtest_date(date: dt.datetime, print_queue: Queue, parameters: dict) -> None:
-    cached_algorithms = {
-        CachedAlgorithm(algorithm) for algorithm in algorithms if parameters["algorithms"][algorithm.name]["run"]
-    }
+logger = logging.getLogger(__name__)
 
+
+def backtest_contests(
+    date: dt.datetime,
+    parameters: dict,
+    print_queue: Queue | None = None,
+    spawned_at: float | None = None,
+    day: DayBundle | None = None,
+    draft_group_ids: Collection[int] | None = None,
+) -> pd.DataFrame | None:
+    """
+    Generates, judges and summarizes lineups for the contests of `date`, or only the contests in `draft_group_ids`
+
+    Returns
+    -------
+    contest_summaries: pd.DataFrame | None
+        The summary of every contest, or None if there weren't any contests to enter
+    """
+    started_at = time.time()
+    cached_algorithms = {CachedAlgorithm(algorithm) for algorithm in load_algorithms(parameters["algorithms"])}
+
+    # worker startup is paid once per date, so keep track of it against the startup budget
+    startup = time.time() - (started_at if spawned_at is None else spawned_at)
+    log = logger.warning if startup > parameters.get("startup_budget", float("inf")) else logger.info
+    log(f"Worker for {date:%Y-%m-%d} started in {startup:.2f}s ({time.time() - started_at:.2f}s loading algorithms)")
+
+    contests_generator = get_contests(date, parameters.get("standings_bins"), day)
+    num_contests: int = next(contests_generator, 0)  # type: ignore
+    per_contest_progress = 1 / max(num_contests, 1)
+
+    # contests are cheap views of the day, so collect them to let algorithms work on all of them at once
+    contests = list(contests_generator)
+    if draft_group_ids is not None:
+        contests = [contest for contest in contests if contest.draft_group_id in draft_group_ids]
+
+    intraday_processes = parameters.get("intraday_processes", 1)
+    if intraday_processes > 1 and len({contest.draft_group_id for contest in contests}) > 1:
+        contests_summaries_lst = backtest_shared_day(contests, parameters, print_queue, per_contest_progress)
+    else:
+        contests_summaries_lst = run_contests(
+            contests, cached_algorithms, parameters, print_queue, per_contest_progress
+        )
+
+    if not contests_summaries_lst:
+        return None
+
+    return pd.concat(contests_summaries_lst, ignore_index=True)
+
+
+def run_contests(
+    contests: List[Contest],
+    cached_algorithms: Set[CachedAlgorithm],
+    parameters: dict,
+    print_queue: Queue | None,
+    per_contest_progress: float,
+) -> List[pd.DataFrame]:
     contests_summaries_lst = []
-    contests = get_contests(date)
-    num_contests: int = next(contests)  # type: ignore
-    per_contest_progress = 1 / num_contests
+    contests_swaps_lst = []
+    swappable_pts: Dict[int, np.ndarray] = {}  # the draftables of each draft group are only scored once
+    lineup_store = LineupStore()
+    prepare_generation_algorithms(contests, cached_algorithms, parameters)
 
     for contest in contests:
         lineups = run_generation_algorithms(contest, cached_algorithms, parameters)
+        lineup_store.add(contest, lineups)
         payouts = get_contest_payouts(lineups, contest)
         contests_summaries_lst.append(summarize_contest(payouts, contest, parameters["run_id"]))
-        print_queue.put((date, per_contest_progress))
+        if parameters.get("swap_analysis", False):
+            if contest.draft_group_id not in swappable_pts:
+                swappable_pts[contest.draft_group_id] = score_swappable_draftables(contest)
+            swaps = evaluate_swaps(
+                lineups, contest, parameters.get("swap_pairs_from", 0), swappable_pts[contest.draft_group_id]
+            )
+            contests_swaps_lst.append(pd.concat({contest.contest_id: swaps}, names=["contest_id"]))
+        if print_queue is not None:
+            print_queue.put((contest.day.date, per_contest_progress))
+
+    # every set of contests run together covers whole draft groups, so its smallest draft group names it uniquely
+    solve_records = pop_solve_records()
+    if contests:
+        date, draft_group_id = contests[0].day.date, min(contest.draft_group_id for contest in contests)
+
+        if parameters.get("store_lineups", True):
+            lineups_dir = parameters.get("lineups_dir", "results/lineups")
+            lineup_store.write(get_lineups_file(lineups_dir, parameters["run_id"], date, draft_group_id))
+
+        if len(solve_records) and parameters.get("solver_telemetry", True):
+            telemetry_dir = parameters.get("telemetry_dir", "results/telemetry")
+            telemetry_file = get_telemetry_file(telemetry_dir, parameters["run_id"], date, draft_group_id)
+            telemetry_file.parent.mkdir(parents=True, exist_ok=True)
+            solve_records.insert(0, "run_id", parameters["run_id"])
+            solve_records.to_csv(telemetry_file, index=False)
+
+        if contests_swaps_lst:
+            swaps_file = get_swaps_file(
+                parameters.get("swaps_dir", "results/swaps"), parameters["run_id"], date, draft_group_id
+            )
+            swaps_file.parent.mkdir(parents=True, exist_ok=True)
+            pd.concat(contests_swaps_lst).to_csv(swaps_file)
+
+    return contests_summaries_lst
+
+
+def split_draft_groups(contests: List[Contest], num_splits: int) -> List[List[Contest]]:
+    """
+    Splits contests into at most `num_splits` groups, keeping each draft group together so its cache isn't shared. The
+    biggest draft groups (by number of contests times number of draftables) are placed first, each in the smallest group
+    """
+    draft_groups: Dict[int, List[Contest]] = defaultdict(list)
+    for contest in contests:
+        draft_groups[contest.draft_group_id].append(contest)
+
+    def cost(draft_group: List[Contest]) -> int:
+        return len(draft_group) * (draft_group[0].draftables_stop - draft_group[0].draftables_start)
+
+    splits: List[List[Contest]] = [[] for _ in range(min(num_splits, len(draft_groups)))]
+    split_costs = [0] * len(splits)
+    for draft_group in sorted(draft_groups.values(), key=cost, reverse=True):
+        smallest = split_costs.index(min(split_costs))
+        splits[smallest].extend(draft_group)
+        split_costs[smallest] += cost(draft_group)
+
+    return splits
+
+
+def backtest_shared_contests(
+    day_name: str, contest_keys: List[tuple], parameters: dict, print_queue: Queue | None, per_contest_progress: float
+) -> List[pd.DataFrame]:
+    day = attach_day(day_name)
+    contests = [Contest(day, *keys) for keys in contest_keys]
+    cached_algorithms = {CachedAlgorithm(algorithm) for algorithm in load_algorithms(parameters["algorithms"])}
+    return run_contests(contests, cached_algorithms, parameters, print_queue, per_contest_progress)
+
+
+def backtest_shared_day(
+    contests: List[Contest], parameters: dict, print_queue: Queue | None, per_contest_progress: float
+) -> List[pd.DataFrame]:
+    """
+    Splits the contests of a day across `intraday_processes` processes, which all read the day from shared memory
+    instead of loading it again
+    """
+    splits = split_draft_groups(contests, parameters["intraday_processes"])
+
+    contests_summaries_lst = []
+    with (
+        shared_day(contests[0].day) as day_name,
+        ProcessPoolExecutor(len(splits), initializer=configure_worker, initargs=get_log_config()) as pool,
+    ):
+        futures = [
+            pool.submit(
+                backtest_shared_contests,
+                day_name,
+                [
+                    (contest.contest_id, contest.draft_group_id, contest.contest_type_id, contest.max_entries)
+                    for contest in split
+                ],
+                parameters,
+                print_queue,
+                per_contest_progress,
+            )
+            for split in splits
+        ]
+
+        for future in futures:
+            contests_summaries_lst.extend(future.result())
+
+    return contests_summaries_lst
 
+
+def write_results(contest_summaries: pd.DataFrame, date: dt.datetime) -> None:
+    results_file = f"results/detailed/{date.strftime(r"%Y-%m-%d")}.csv"
+
+    contest_summaries.to_csv(
+        results_file,
+        mode="a",
+        index=False,
+        header=not os.path.exists(results_file),
+    )
+
+    summarize_runs(contest_summaries, date)
+
+
+def backtest_date(
+    date: dt.datetime,
+    print_queue: Queue,
+    parameters: dict,
+    spawned_at: float | None = None,
+    day: DayBundle | None = None,
+    writing: "Synchronized[int] | None" = None,
+) -> None:
+    """
+    Backtests `date` and writes its results. `writing` is set (under its lock) before any results are written, so the
+    process that started this one knows it can no longer stop it without leaving partial results
+    """
+    contest_summaries = backtest_contests(date, parameters, print_queue, spawned_at, day)
+
+    if writing is not None:
+        with writing.get_lock():
+            writing.value = 1
+
+    if contest_summaries is not None:
+        write_results(contest_summaries, date)
+
+    # only once the results are written, so a date that's reported as done is never stopped and run again
     print_queue.put((date, "DONE"))
 
-    if contests_summaries_lst:
-        contest_summaries = pd.concat(contests_summaries_lst, ignore_index=True)
 
-        results_file = f"results/detailed/{date.strftime(r"%Y-%m-%d")}.csv"
+def rejudge(run_id: int, parameters: dict) -> None:
+    """
+    Judges and summarizes the lineups stored by run `run_id` again, as a new run, without generating any lineups
 
-        contest_summaries.to_csv(
-            results_file,
-            mode="a",
-            index=False,
-            header=not os.path.exists(results_file),
-        )
+    Contests are loaded the same way as a backtest with `parameters` would load them, so changes to the judging or
+    summarizing of lineups (or e.g. `standings_bins`) are picked up
+    """
+    logger.info(f"Rejudging run {run_id} as run {parameters['run_id']}")
+
+    for date, stored_lineups in read_lineups(parameters.get("lineups_dir", "results/lineups"), run_id):
+        contests_generator = get_contests(date, parameters.get("standings_bins"))
+        next(contests_generator, 0)
+
+        contests_summaries_lst = []
+        for contest in contests_generator:
+            if contest.contest_id not in stored_lineups:
+                continue
+
+            lineups = get_stored_lineups(stored_lineups.pop(contest.contest_id), contest)
+            payouts = get_contest_payouts(lineups, contest)
+            contests_summaries_lst.append(summarize_contest(payouts, contest, parameters["run_id"]))
 
-        summarize_runs(contest_summaries, date)
+        if stored_lineups:
+            logger.warning(f"Skipped {len(stored_lineups)} stored contests on {date:%Y-%m-%d} that could not be loaded")
+
+        if contests_summaries_lst:
+            write_results(pd.concat(contests_summaries_lst, ignore_index=True), date)
 
 
 def backtest_sequential(print_queue: Queue, result_queue: Queue, parameters: dict):
     with Printer(print_queue, result_queue, parameters):
-        for date in parameters["dates"]:
-            backtest_date(date, print_queue, parameters)
+        days = DayPrefetcher(parameters["dates"], parameters.get("prefetch_days", 0), parameters.get("standings_bins"))
+        for date, day in days:
+            if day is None:  # the prefetcher already tried to load it
+                logger.info(f"Skipping {date}")
+                print_queue.put((date, "DONE"))
+                continue
+
+            backtest_date(date, print_queue, parameters, day=day)
+
+
+@dataclass
+class Worker:
+    process: multiprocessing.Process
+    estimate: float
+    started_at: float
+    writing: "Synchronized[int]"  # set by the worker once it starts writing its results
+    peak: int = 0
+    finished: bool = False  # reported its results, and is only exiting now
+
+
+def write_memory_report(date: dt.datetime, run_id: int, worker: Worker, attempts: int) -> None:
+    logger.info(
+        f"Peak memory for {date:%Y-%m-%d} was {format_bytes(worker.peak)} (estimated {format_bytes(worker.estimate)})"
+    )
+
+    memory_file = "results/memory.csv"
+    pd.DataFrame(
+        [[run_id, date, worker.estimate, worker.peak, attempts]],
+        columns=["run_id", "date", "estimated_bytes", "peak_bytes", "attempts"],
+    ).to_csv(memory_file, mode="a", index=False, header=not os.path.exists(memory_file), float_format="%.0f")
 
 
 def backtest_parallelize(print_queue: Queue, result_queue: Queue, parameters: dict):
+    """
+    Backtests each date in its own process, running as many at once as fit in `memory_budget_gb`
+
+    A date's memory is estimated from the size of its files, and dates are only started while the running dates'
+    estimates (or their measured memory, if that's higher) leave room for it. If the running dates use more than the
+    budget anyway, the most recently started one is stopped and requeued with its measured memory as its estimate. Dates
+    that started writing their results are never stopped, but count against the budget until their process exits
+    """
+    memory_budget = parameters.get("memory_budget_gb", 0) * 2**30 or float("inf")
+    worker_memory = parameters.get("worker_memory_mb", 300) * 2**20
+    memory_per_file_byte = parameters.get("memory_per_file_byte", 2.0)
+    standings_bins = parameters.get("standings_bins")
+
     with Printer(print_queue, result_queue, parameters):
-        processes = {}
-        for date in parameters["dates"]:
-            process = multiprocessing.Process(target=backtest_date, args=(date, print_queue, parameters))
-            process.start()
-            processes[date] = process
-
-            if len(processes) >= parameters["concurrent_threads"]:
-                finished_date = result_queue.get()
-                del processes[finished_date]
-
-        # Wait for all workers to finish
-        for process in processes.values():
-            process.join()
+        pending = deque(parameters["dates"])
+        estimates = {
+            date: worker_memory + memory_per_file_byte * get_day_size(date, standings_bins) for date in pending
+        }
+        attempts: Dict[dt.datetime, int] = defaultdict(int)
+        workers: Dict[dt.datetime, Worker] = {}
+
+        while pending or workers:
+            # start as many dates as fit in the memory budget, but always keep at least one running
+            measured = sum(worker.peak for worker in workers.values())
+            committed = max(sum(worker.estimate for worker in workers.values()), measured)
+            while (
+                pending
+                and len(workers) < parameters["concurrent_threads"]
+                and (not workers or committed + estimates[pending[0]] <= memory_budget)
+            ):
+                date = pending.popleft()
+                writing = multiprocessing.Value("b", 0)
+                process = multiprocessing.Process(
+                    target=run_with_logging,
+                    args=(get_log_config(), backtest_date, date, print_queue, parameters, time.time(), None, writing),
+                )
+                process.start()
+                workers[date] = Worker(process, estimates[date], time.time(), writing)
+                attempts[date] += 1
+                committed += estimates[date]
+
+            try:
+                finished_date = result_queue.get(timeout=parameters.get("memory_poll_seconds", 1))
+            except queue.Empty:
+                finished_date = None
+
+            if finished_date in workers:
+                worker = workers[finished_date]
+                worker.finished = True
+                write_memory_report(finished_date, parameters["run_id"], worker, attempts[finished_date])
+
+            # a worker that's still running can't be using less memory than it is right now
+            rss = {date: get_rss(worker.process.pid) for date, worker in workers.items()}  # type: ignore
+            for date, worker in workers.items():
+                worker.peak = max(worker.peak, rss[date] or 0)
+
+            for date, worker in list(workers.items()):
+                if worker.process.is_alive():
+                    continue
+                if worker.process.exitcode != 0:
+                    logger.error(f"Worker for {date:%Y-%m-%d} exited with code {worker.process.exitcode}")
+                    if not worker.finished:
+                        print_queue.put((date, "DONE"))
+                elif not worker.finished:  # its results are still on their way through the printer
+                    continue
+
+                worker.process.join()
+                del workers[date]
+
+            running = [date for date, worker in workers.items() if not worker.finished and not worker.writing.value]
+            if len(running) > 1 and sum(size or 0 for size in rss.values()) > memory_budget:
+                date = max(running, key=lambda date: workers[date].started_at)
+                worker = workers[date]
+
+                # the worker can't start writing its results while it's being stopped, and isn't stopped once it has
+                with worker.writing.get_lock():
+                    stopped = not worker.writing.value
+                    if stopped:
+                        worker.process.terminate()
+                        worker.process.join()
+
+                if stopped:
+                    del workers[date]
+                    logger.warning(
+                        f"Requeued {date:%Y-%m-%d} after running over the {format_bytes(memory_budget)} memory budget"
+                    )
+                    estimates[date] = max(estimates[date], worker.peak)
+                    pending.appendleft(date)
+                    print_queue.put((date, "RESET"))
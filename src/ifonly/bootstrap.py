@@ -0,0 +1,229 @@
+# Confidence intervals for the results of runs, by resampling whole dates (contests on the same date share players, so
+# they aren't independent) with replacement
+
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Collection, Dict, List, Sequence
+import pandas as pd
+import numpy as np
+import itertools
+
+STATISTICS = ("roi", "profit", "percentile")
+RESULTS_DIR = Path("results/detailed")
+
+
+@dataclass
+class DateTotals:
+    """The totals of each group (e.g. each run's algorithm) on each date, zero on dates a group didn't enter"""
+
+    groups: pd.Index
+    dates: pd.Index
+    entry_fees: np.ndarray  # (groups, dates)
+    payouts: np.ndarray
+    percentiles: np.ndarray  # the sum of the percentile of every lineup
+    lineups: np.ndarray
+
+    @classmethod
+    def from_results(cls, results: pd.DataFrame, by: Sequence[str]) -> "DateTotals":
+        totals = (
+            results.assign(percentile=(results.entries - results.place) / (results.entries - 1))
+            .groupby([*by, "date"])
+            .agg(
+                entry_fees=("entry_fee", "sum"),
+                payouts=("payout", "sum"),
+                percentiles=("percentile", "sum"),
+                lineups=("payout", "size"),
+            )
+            .unstack("date", fill_value=0)
+        )
+        return cls(
+            groups=totals.index,
+            dates=totals.columns.unique("date"),
+            **{
+                name: totals[name].to_numpy(dtype="float64")
+                for name in ["entry_fees", "payouts", "percentiles", "lineups"]
+            },
+        )
+
+    def take(self, groups: np.ndarray, dates: np.ndarray) -> "DateTotals":
+        """Returns the totals of only the groups and dates at the positions `groups` and `dates`"""
+        return DateTotals(
+            groups=self.groups[groups],
+            dates=self.dates[dates],
+            **{
+                name: getattr(self, name)[np.ix_(groups, dates)]
+                for name in ["entry_fees", "payouts", "percentiles", "lineups"]
+            },
+        )
+
+    def get_statistics(self, weights: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        Returns each statistic of each group, with each date counted as many times as its weight. `weights` is
+        (dates,) for a single sample, or (dates, replicates) for many
+        """
+        entry_fees, payouts = self.entry_fees @ weights, self.payouts @ weights
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return {
+                "roi": (payouts - entry_fees) / entry_fees,
+                "profit": payouts - entry_fees,
+                "percentile": (self.percentiles @ weights) / (self.lineups @ weights),
+            }
+
+
+def load_detailed_results(
+    run_ids: Collection[int] | None = None, results_dir: str | Path = RESULTS_DIR
+) -> pd.DataFrame:
+    """Loads the lineups of every contest in `results_dir`, only keeping the ones from `run_ids` if they're given"""
+    results_files = sorted(Path(results_dir).glob("*.csv"))
+    if not results_files:
+        raise FileNotFoundError(f"No contest results were written to {results_dir}")
+
+    results = pd.concat(
+        [pd.read_csv(results_file).assign(date=pd.to_datetime(results_file.stem)) for results_file in results_files],
+        ignore_index=True,
+    )
+
+    if run_ids is not None:
+        results = results.loc[results.run_id.isin(run_ids)]
+    return results
+
+
+def resample(
+    date_totals: DateTotals,
+    replicates: int,
+    chunk_size: int,
+    rng: np.random.Generator,
+    date_sets: np.ndarray | None = None,
+) -> Dict[str, np.ndarray]:
+    """
+    Returns `replicates` bootstrap replicates of each statistic of each group, as (groups, replicates) arrays
+
+    Each group is resampled over only its own dates, the dates it entered or its row of the (groups, dates) mask
+    `date_sets`, so its intervals don't depend on which other groups are resampled with it. Each replicate draws as many
+    of those dates as there are with replacement, which is the same as weighting each date by how many times it was
+    drawn. Groups with the same dates are resampled with the same draws
+
+    Replicates are drawn `chunk_size` at a time, so only a (dates, chunk_size) array of weights is held in memory at
+    once
+    """
+    if date_sets is None:
+        date_sets = date_totals.lineups > 0
+
+    replicated = {name: np.full((len(date_totals.groups), replicates), np.nan) for name in STATISTICS}
+    unique_sets, set_nums = np.unique(date_sets, axis=0, return_inverse=True)
+
+    for set_num, date_set in enumerate(unique_sets):
+        dates = np.flatnonzero(date_set)
+        if not len(dates):
+            continue
+
+        groups = np.flatnonzero(set_nums.ravel() == set_num)
+        set_totals = date_totals.take(groups, dates)
+        for start in range(0, replicates, chunk_size):
+            stop = min(start + chunk_size, replicates)
+            weights = rng.multinomial(len(dates), np.full(len(dates), 1 / len(dates)), size=stop - start).T
+            for name, values in set_totals.get_statistics(weights).items():
+                replicated[name][groups, start:stop] = values
+
+    return replicated
+
+
+def get_intervals(
+    estimates: Dict[str, np.ndarray], replicated: Dict[str, np.ndarray], index: pd.Index, confidence: float
+) -> pd.DataFrame:
+    alpha = 1 - confidence
+    columns = {}
+    for name in STATISTICS:
+        low, high = np.nanquantile(replicated[name], [alpha / 2, 1 - alpha / 2], axis=1)
+        columns.update({name: estimates[name], f"{name}_low": low, f"{name}_high": high})
+
+    return pd.DataFrame(columns, index=index)
+
+
+def bootstrap_runs(
+    results: pd.DataFrame,
+    by: Sequence[str] = ("run_id", "algorithm"),
+    replicates: int = 10_000,
+    confidence: float = 0.95,
+    chunk_size: int = 1_000,
+    seed: int | None = None,
+) -> pd.DataFrame:
+    """
+    Estimates the ROI, profit and mean percentile of each group of `results`, with block-by-date bootstrap confidence
+    intervals
+
+    Returns
+    -------
+    intervals: pd.DataFrame
+        The estimate of each statistic, along with the bounds of its `confidence` interval (`_low` and `_high`), for
+        each group
+    """
+    date_totals = DateTotals.from_results(results, by)
+    replicated = resample(date_totals, replicates, chunk_size, np.random.default_rng(seed))
+    estimates = date_totals.get_statistics(np.ones(len(date_totals.dates)))
+
+    intervals = get_intervals(estimates, replicated, date_totals.groups, confidence)
+    intervals.insert(0, "dates", (date_totals.lineups > 0).sum(axis=1))
+    intervals.insert(1, "lineups", date_totals.lineups.sum(axis=1).astype("int64"))
+    return intervals
+
+
+def compare_algorithms(
+    results: pd.DataFrame,
+    by: Sequence[str] = ("run_id", "algorithm"),
+    replicates: int = 10_000,
+    confidence: float = 0.95,
+    chunk_size: int = 1_000,
+    seed: int | None = None,
+) -> pd.DataFrame:
+    """
+    Compares every pair of groups of `results` on the contests they both entered, resampling the same dates (out of
+    the dates of their shared contests) for both groups of a pair so that the noise of the contests themselves cancels
+    out
+
+    Returns
+    -------
+    comparisons: pd.DataFrame
+        For each pair, the difference (first minus second) of each statistic with its `confidence` interval, and
+        `<statistic>_p`, the share of replicates where the difference has the opposite sign
+    """
+    group_keys = results.groupby(list(by)).groups
+    contests = {
+        key: set(map(tuple, results.loc[index, ["date", "contest_id"]].to_numpy())) for key, index in group_keys.items()
+    }
+
+    # every pair is resampled together, as two groups that only hold their shared contests
+    pairs: List[tuple] = []
+    pair_results = []
+    for first, second in itertools.combinations(group_keys, 2):
+        shared = contests[first] & contests[second]
+        if not shared:
+            continue
+
+        for pair_side, key in enumerate((first, second)):
+            side_results = results.loc[group_keys[key]]
+            in_shared = pd.MultiIndex.from_frame(side_results[["date", "contest_id"]]).isin(shared)
+            pair_results.append(side_results.loc[in_shared].assign(pair=len(pairs), pair_side=pair_side))
+        pairs.append((first, second))
+
+    if not pairs:
+        return pd.DataFrame()
+
+    # groups are ordered (pair, side), so every even row is the first of a pair and every odd row the second
+    date_totals = DateTotals.from_results(pd.concat(pair_results, ignore_index=True), ["pair", "pair_side"])
+    entered = date_totals.lineups > 0
+    pair_dates = np.repeat(entered[0::2] | entered[1::2], 2, axis=0)
+    replicated = resample(date_totals, replicates, chunk_size, np.random.default_rng(seed), pair_dates)
+    estimates = date_totals.get_statistics(np.ones(len(date_totals.dates)))
+
+    differences = {name: values[0::2] - values[1::2] for name, values in estimates.items()}
+    replicated_differences = {name: values[0::2] - values[1::2] for name, values in replicated.items()}
+
+    index = pd.MultiIndex.from_tuples([(str(first), str(second)) for first, second in pairs], names=["first", "second"])
+    comparisons = get_intervals(differences, replicated_differences, index, confidence)
+    for name in STATISTICS:
+        opposite = np.sign(replicated_differences[name]) != np.sign(differences[name])[:, None]
+        comparisons[f"{name}_p"] = opposite.mean(axis=1)
+
+    comparisons.insert(0, "contests", [len(contests[first] & contests[second]) for first, second in pairs])
+    return comparisons
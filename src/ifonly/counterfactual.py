@@ -0,0 +1,190 @@
+# Answer "if only" questions about generated lineups: where each lineup would have placed, and what it would have won,
+# if one (or two) of its players had been swapped for another draftable of the same roster slot
+
+from ifonly import Contest
+from ifonly.judge import get_places, lookup_payouts, score_draftables
+from ifonly.lineups.batch import LineupBatch, PADDING
+from ifonly.lineups.validate import LineupLookups, validate_lineups
+from pathlib import Path
+from typing import Tuple
+import datetime as dt
+import pandas as pd
+import numpy as np
+
+
+def get_swaps_file(swaps_dir: str | Path, run_id: int, date: dt.datetime, draft_group_id: int) -> Path:
+    return Path(swaps_dir) / str(run_id) / f"{date:%Y-%m-%d}-{draft_group_id}.csv"
+
+
+def get_single_swaps(lineups: np.ndarray, lookups: LineupLookups) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Finds every swap of one drafted player for another draftable of the same roster slot that leaves a valid lineup
+
+    Returns
+    -------
+    lineup_nums: np.ndarray
+        The row of `lineups` each swap is made in
+    slots: np.ndarray
+        The column of `lineups` each swap replaces
+    draftables: np.ndarray
+        The position in `contest.draftables` of the draftable each swap drafts instead
+    """
+    # only draftables of the same roster slot can take a drafted player's place, padding can't be swapped
+    drafted_slots = np.where(lineups != PADDING, lookups.roster_slots[lineups], -1)
+    same_slot = drafted_slots[:, :, None] == lookups.roster_slots[None, None, :]
+    lineup_nums, slots, draftables = np.nonzero(same_slot & (lineups[:, :, None] != np.arange(len(lookups))))
+
+    swapped = lineups[lineup_nums]
+    swapped[np.arange(len(swapped)), slots] = draftables
+    valid, _ = validate_lineups(swapped, lookups)
+
+    return lineup_nums[valid], slots[valid], draftables[valid]
+
+
+def get_pair_swaps(
+    lineups: np.ndarray,
+    lookups: LineupLookups,
+    single_swaps: Tuple[np.ndarray, np.ndarray, np.ndarray],
+    gains: np.ndarray,
+    pairs_from: int,
+) -> Tuple[np.ndarray, ...]:
+    """
+    Combines the `pairs_from` single swaps that gain the most points in each lineup into pairs of swaps in different
+    slots, keeping the pairs that leave a valid lineup
+
+    Returns
+    -------
+    lineup_nums, slots, draftables, slots_2, draftables_2: np.ndarray
+        The same as `get_single_swaps`, for the first and second swap of each pair
+    """
+    lineup_nums, slots, draftables = single_swaps
+
+    # the best `pairs_from` single swaps of each lineup, ordered by lineup
+    order = np.lexsort((-gains, lineup_nums))
+    rank_in_lineup = np.arange(len(order)) - np.searchsorted(lineup_nums[order], lineup_nums[order])
+    best = order[rank_in_lineup < pairs_from]
+
+    # every pair (i, j) with i < j of the best swaps in the same lineup, as offsets into the lineup's block of `best`
+    block_starts = np.flatnonzero(np.diff(lineup_nums[best], prepend=-1))
+    block_sizes = np.diff(block_starts, append=len(best))
+    i, j = np.triu_indices(pairs_from, k=1)
+    in_block = j[None, :] < block_sizes[:, None]
+    first = best[(block_starts[:, None] + i)[in_block]]
+    second = best[(block_starts[:, None] + j)[in_block]]
+    different_slots = slots[first] != slots[second]
+    first, second = first[different_slots], second[different_slots]
+
+    swapped = lineups[lineup_nums[first]]
+    swapped[np.arange(len(swapped)), slots[first]] = draftables[first]
+    swapped[np.arange(len(swapped)), slots[second]] = draftables[second]
+    valid, _ = validate_lineups(swapped, lookups)
+    first, second = first[valid], second[valid]
+
+    return lineup_nums[first], slots[first], draftables[first], slots[second], draftables[second]
+
+
+def score_swappable_draftables(contest: Contest) -> np.ndarray:
+    """
+    Scores every draftable of the contest's draft group, which contests of the same draft group can share. Draftables
+    without an exact box score (mostly players who didn't play) score 0 instead of being approximately matched
+    """
+    return score_draftables(
+        contest.draftables, contest.box_scores, contest.draft_group.contest_type_id, approximate=False
+    ).to_numpy()
+
+
+def evaluate_swaps(
+    lineups: LineupBatch | pd.DataFrame,
+    contest: Contest,
+    pairs_from: int = 0,
+    draftable_pts: np.ndarray | None = None,
+) -> pd.DataFrame:
+    """
+    Scores every valid single-player swap of every lineup at once, and optionally pairs of the best ones
+
+    Parameters
+    ----------
+    lineups: LineupBatch | pd.DataFrame
+        The generated lineups of the contest
+    contest: Contest
+        The contest the lineups were entered in
+    pairs_from: int
+        When > 0, the number of single swaps (the ones gaining the most points) of each lineup to also try in pairs
+    draftable_pts: np.ndarray | None
+        The points of every draftable from `score_swappable_draftables`, scored here if they aren't given
+
+    Returns
+    -------
+    swaps: pd.DataFrame
+        One row per swap, indexed by the ("algorithm", "lineup_num") of the lineup it's made in. Columns hold the
+        draftable ids swapped out and in (`_2` columns are only set for pairs), and the fpts, place and payout the
+        lineup would have had, along with how much each changed
+    """
+    if isinstance(lineups, pd.DataFrame):
+        lineups = LineupBatch.from_frame(lineups, contest.draftables)
+
+    # lineups of one contest all draft the same number of players, so only columns that are padding in every lineup
+    # (from being stored alongside bigger lineups) can be dropped
+    positions = lineups.positions.astype("int64")
+    positions = positions[:, (positions != PADDING).any(axis=0)]
+    lookups = LineupLookups.from_contest(contest)
+    draftable_ids = np.append(contest.draftables.index.to_numpy(), PADDING)
+
+    # drafted players are scored the same as they're judged, the extra trailing 0 is what padding positions pick up
+    if draftable_pts is None:
+        draftable_pts = score_swappable_draftables(contest)
+    draftable_pts = np.append(draftable_pts, 0)
+    drafted = np.unique(positions[positions != PADDING])
+    draftable_pts[drafted] = score_draftables(
+        contest.draftables.iloc[drafted], contest.box_scores, contest.draft_group.contest_type_id
+    ).to_numpy()
+    lineup_pts = draftable_pts[positions].sum(axis=1)
+    lineup_places, _ = get_places(lineup_pts, contest)
+    lineup_payouts = lookup_payouts(lineup_places, contest)
+
+    lineup_nums, slots, draftables = get_single_swaps(positions, lookups)
+    gains = draftable_pts[draftables] - draftable_pts[positions[lineup_nums, slots]]
+
+    # single swaps don't have a second swap, which is marked with PADDING
+    slots_2 = np.full(len(lineup_nums), PADDING)
+    draftables_2 = np.full(len(lineup_nums), PADDING)
+
+    if pairs_from > 0:
+        pair_nums, pair_slots, pair_draftables, pair_slots_2, pair_draftables_2 = get_pair_swaps(
+            positions, lookups, (lineup_nums, slots, draftables), gains, pairs_from
+        )
+        pair_gains = (
+            draftable_pts[pair_draftables]
+            - draftable_pts[positions[pair_nums, pair_slots]]
+            + draftable_pts[pair_draftables_2]
+            - draftable_pts[positions[pair_nums, pair_slots_2]]
+        )
+
+        lineup_nums = np.concatenate([lineup_nums, pair_nums])
+        slots = np.concatenate([slots, pair_slots])
+        draftables = np.concatenate([draftables, pair_draftables])
+        slots_2 = np.concatenate([slots_2, pair_slots_2])
+        draftables_2 = np.concatenate([draftables_2, pair_draftables_2])
+        gains = np.concatenate([gains, pair_gains])
+
+    # every swap of the contest is placed and paid out in one pass
+    swap_pts = lineup_pts[lineup_nums] + gains
+    swap_places, swap_place_errors = get_places(swap_pts, contest)
+    swap_payouts = lookup_payouts(swap_places, contest)
+
+    return pd.DataFrame(
+        {
+            "out_draftable_id": draftable_ids[positions[lineup_nums, slots]],
+            "in_draftable_id": draftable_ids[draftables],
+            "out_draftable_id_2": draftable_ids[np.where(slots_2 != PADDING, positions[lineup_nums, slots_2], PADDING)],
+            "in_draftable_id_2": draftable_ids[draftables_2],
+            "fpts": swap_pts,
+            "fpts_delta": gains,
+            "place": swap_places,
+            "place_error": swap_place_errors,
+            "place_delta": swap_places - lineup_places[lineup_nums],
+            "payout": swap_payouts,
+            "payout_delta": swap_payouts - lineup_payouts[lineup_nums],
+        },
+        index=lineups.index[lineup_nums],
+    )
@@ -1,13 +1,31 @@
 import pandas as pd
 import datetime as dt
 from pathlib import Path
-from typing import Generator
-from ifonly import Contest
+from typing import Deque, Dict, Generator, Iterator, List, Tuple
+from concurrent.futures import ThreadPoolExecutor, Future
+from collections import deque
+from ifonly import Contest, DayBundle
+from ifonly.history.features import (
+    FeatureStore,
+    get_player_keys,
+    get_season,
+    read_feature_store,
+    write_feature_store,
+)
+from ifonly.history.standings import (
+    StandingsSketch,
+    build_standings_sketches,
+    read_standings_sketches,
+    write_standings_sketches,
+)
 from ifonly.utils.matcher import approximate_match
+from functools import cache, lru_cache
+from dataclasses import fields
+import numpy as np
+import itertools
 import logging
 
 logger = logging.getLogger(__name__)
-logging.basicConfig(filename="ifonly.log", level=logging.INFO)
 
 DATA_DIR = Path("D:/draft-kings-db")
 COMPETITIONS_DIR = DATA_DIR / "competitions"
@@ -21,6 +39,10 @@ LINEUP_REQS_DIR = DATA_DIR / "lineup-requirements"
 MAX_ENTRIES_DIR = DATA_DIR / "max-entries"
 PAYOUTS_DIR = DATA_DIR / "payouts"
 PROJECTIONS_DIR = DATA_DIR / "projections"
+STANDINGS_SKETCHES_DIR = DATA_DIR / "standings-sketches"
+FEATURES_DIR = DATA_DIR / "features"
+
+REFERENCES_DIR = Path(__file__).resolve().parents[3] / "references"
 
 TEAM_MAPPINGS = {
     "BRK": "BKN",
@@ -33,6 +55,52 @@ TEAM_MAPPINGS = {
 }
 
 
+# The columns read from each table and their types, columns that aren't listed are never parsed and columns typed None
+# are left for pandas to infer. Draft Kings points are multiples of 0.25, so they're exact as float32, while money isn't
+# downcast so sums of it don't lose cents
+SCHEMAS: Dict[str, Dict[str, str | None]] = {
+    "standings": {"contest_id": "int32", "EntryId": "int64", "Points": "float32"},
+    "contests": {"contest_id": "int32", "name": "object", "draft_group_id": "int32", "entry_fee": None},
+    "draftables": {
+        "draft_group_id": "int32",
+        "draftable_id": "int32",
+        "player_id": "int32",
+        "name": "category",
+        "team": "category",
+        "salary": "int32",
+        "roster_slot_id": "int16",
+        "competition_id": "int32",
+    },
+    "competitions": {"competition_id": "int32", "starts_at": "datetime"},
+    "draft_groups": {"draft_group_id": "int32", "contest_type_id": "int16", "games_count": "int16"},
+    "draft_group_games": {"draft_group_id": "int32", "game_id": "int32"},
+    "lineup_reqs": {"contest_type_id": "int16", "roster_slot_id": "int16", "count": "int8"},
+    "max_entries": {"entry_max_per_user": "int32"},
+    # positions stay int64 to match the places they're merged with
+    "payouts": {"contest_id": "int32", "minPosition": "int64", "maxPosition": "int64", "payout": None},
+    "box_scores": {"team": "category", "name": "category", "fpts": "float32", "pts": "float32"},
+    "projections": {
+        "team": "category",
+        "player_id": "int32",
+        "player_name": "category",
+        "fpts": "float32",
+        "pts": "float32",
+    },
+}
+
+
+def read_table(path: Path, table: str, **kwargs) -> pd.DataFrame:
+    schema = SCHEMAS[table]
+    dtypes = {column: dtype for column, dtype in schema.items() if dtype not in {None, "datetime"}}
+    dates = [column for column, dtype in schema.items() if dtype == "datetime"]
+    return pd.read_csv(path, usecols=lambda column: column in schema, dtype=dtypes, parse_dates=dates, **kwargs)
+
+
+def map_teams(teams: pd.Series) -> pd.Series:
+    # mapping the categories (instead of every row) can merge two of them, so the categories are rebuilt after
+    return teams.map(lambda team: TEAM_MAPPINGS.get(team, team)).astype("category")
+
+
 def read_standings(date: dt.datetime) -> pd.DataFrame:
     # Access historical standings
     # standings_date_dir = date.strftime(r"%m-%d-%Y")
@@ -45,7 +113,7 @@ def read_standings(date: dt.datetime) -> pd.DataFrame:
 
     # return pd.concat(all_standings).set_index("contest_id", append=True).swaplevel()
     standings_file = date.strftime(r"%m-%d-%Y") + ".csv"
-    standings = pd.read_csv(STANDINGS_DIR / standings_file, index_col=["contest_id", "EntryId"])
+    standings = read_table(STANDINGS_DIR / standings_file, "standings", index_col=["contest_id", "EntryId"])
     return standings
 
 
@@ -53,15 +121,16 @@ def read_contests_details(date: dt.datetime) -> pd.DataFrame:
     # Access historical contests
     contest_details_file = date.strftime(r"%m-%d-%Y") + ".csv"
 
-    return pd.read_csv(CONTESTS_DIR / contest_details_file, index_col="contest_id", parse_dates=["starts_at"])
+    return read_table(CONTESTS_DIR / contest_details_file, "contests", index_col="contest_id")
 
 
 def read_draftables(date: dt.datetime) -> pd.DataFrame:
     # Access historical contests
     draftables_file = date.strftime(r"%m-%d-%Y") + ".csv"
 
-    return pd.read_csv(
+    return read_table(
         DRAFTABLES_DIR / draftables_file,
+        "draftables",
         index_col=["draft_group_id", "draftable_id"],
     )
 
@@ -69,18 +138,19 @@ def read_draftables(date: dt.datetime) -> pd.DataFrame:
 def read_competitions(date: dt.datetime) -> pd.DataFrame:
     competitions_file = date.strftime(r"%m-%d-%Y") + ".csv"
 
-    return pd.read_csv(
+    return read_table(
         COMPETITIONS_DIR / competitions_file,
+        "competitions",
         index_col="competition_id",
-        parse_dates=["starts_at"],
     )
 
 
 def read_draft_groups(date: dt.datetime) -> pd.DataFrame:
     draft_groups_file = date.strftime(r"%m-%d-%Y") + ".csv"
 
-    return pd.read_csv(
+    return read_table(
         DRAFT_GROUPS_DIR / draft_groups_file,
+        "draft_groups",
         index_col="draft_group_id",
     )
 
@@ -88,8 +158,9 @@ def read_draft_groups(date: dt.datetime) -> pd.DataFrame:
 def read_draft_group_games(date: dt.datetime) -> pd.DataFrame:
     draft_group_games_file = date.strftime(r"%m-%d-%Y") + ".csv"
 
-    return pd.read_csv(
+    return read_table(
         DRAFT_GROUP_GAMES_DIR / draft_group_games_file,
+        "draft_group_games",
         index_col="draft_group_id",
     )
 
@@ -97,8 +168,9 @@ def read_draft_group_games(date: dt.datetime) -> pd.DataFrame:
 def read_lineup_reqs(date: dt.datetime) -> pd.Series:
     dated_file = date.strftime(r"%m-%d-%Y") + ".csv"
 
-    return pd.read_csv(
+    return read_table(
         LINEUP_REQS_DIR / dated_file,
+        "lineup_reqs",
         index_col=["contest_type_id", "roster_slot_id"],
     )["count"]
 
@@ -106,16 +178,20 @@ def read_lineup_reqs(date: dt.datetime) -> pd.Series:
 def read_max_entries(date: dt.datetime) -> pd.Series:
     max_entries_file = date.strftime(r"%m-%d-%Y") + ".csv"
 
+    # the contest ids are in the first (unnamed) column, so only the types are set
     return (
-        pd.read_csv(MAX_ENTRIES_DIR / max_entries_file, index_col=0).rename(index={0: "contest_id"}).entry_max_per_user
+        pd.read_csv(MAX_ENTRIES_DIR / max_entries_file, index_col=0, dtype=SCHEMAS["max_entries"])
+        .rename(index={0: "contest_id"})
+        .entry_max_per_user
     )
 
 
 def read_payouts(date: dt.datetime) -> pd.DataFrame:
     payouts_file = date.strftime(r"%m-%d-%Y") + ".csv"
 
-    return pd.read_csv(
+    return read_table(
         PAYOUTS_DIR / payouts_file,
+        "payouts",
         index_col=["contest_id", "minPosition"],
     )
 
@@ -124,8 +200,8 @@ def read_box_scores(date: dt.datetime) -> pd.DataFrame:
     box_scores_file = date.strftime(r"%Y-%m-%d") + ".csv"
 
     return (
-        pd.read_csv(BOX_SCORES_DIR / box_scores_file)
-        .assign(team=lambda df: df.team.replace(TEAM_MAPPINGS))
+        read_table(BOX_SCORES_DIR / box_scores_file, "box_scores")
+        .assign(team=lambda df: map_teams(df.team))
         .set_index(["team", "name"])
     )
 
@@ -134,17 +210,24 @@ def read_projections(date: dt.datetime) -> pd.DataFrame:
     projections_file = date.strftime(r"%Y-%m-%d") + ".csv"
 
     return (
-        pd.read_csv(PROJECTIONS_DIR / projections_file)
-        .assign(
-            team=lambda df: df.team.replace(TEAM_MAPPINGS),
-            opp=lambda df: df.opp.replace(TEAM_MAPPINGS),
-        )
+        read_table(PROJECTIONS_DIR / projections_file, "projections")
+        .assign(team=lambda df: map_teams(df.team))
         .rename(columns={"player_name": "name"})
         .set_index(["team", "player_id", "name"])
         .sort_index()
     )
 
 
+@cache
+def read_contest_types() -> pd.DataFrame:
+    return pd.read_csv(REFERENCES_DIR / "contest_types.csv", index_col="game_type_id")
+
+
+def get_salary_cap(contest_type_id: int) -> float:
+    contest_type = read_contest_types().loc[contest_type_id]
+    return contest_type.salary_max if contest_type.has_salary_cap else np.inf
+
+
 def get_contest_projections(draftables: pd.DataFrame, projections: pd.DataFrame, contest_type_id: int) -> pd.Series:
     projection_col = "pts" if contest_type_id == 335 else "fpts"
 
@@ -177,35 +260,309 @@ def get_contest_projections(draftables: pd.DataFrame, projections: pd.DataFrame,
     return contest_projections
 
 
-def get_contests(date: dt.datetime) -> Generator[Contest, None, None]:
+def get_offsets(table: pd.DataFrame, level: str) -> pd.DataFrame:
+    """Returns the start and stop row of each value of `level` in a table that's sorted by `level`"""
+    keys = table.index.get_level_values(level).to_numpy()
+    unique_keys, starts = np.unique(keys, return_index=True)
+    stops = np.append(starts[1:], len(keys))
+    return pd.DataFrame({"start": starts, "stop": stops}, index=pd.Index(unique_keys, name=level))
+
+
+def get_standings_sketch_file(date: dt.datetime, num_bins: int) -> Path:
+    return STANDINGS_SKETCHES_DIR / (date.strftime(r"%m-%d-%Y") + f"-{num_bins}.npz")
+
+
+def get_day_files(date: dt.datetime, standings_bins: int | None = None) -> List[Path]:
+    """Returns every file `load_day` reads for `date`"""
+    dated_file = date.strftime(r"%m-%d-%Y") + ".csv"
+    iso_dated_file = date.strftime(r"%Y-%m-%d") + ".csv"
+
+    day_files = [
+        COMPETITIONS_DIR / dated_file,
+        CONTESTS_DIR / dated_file,
+        DRAFTABLES_DIR / dated_file,
+        DRAFT_GROUPS_DIR / dated_file,
+        DRAFT_GROUP_GAMES_DIR / dated_file,
+        LINEUP_REQS_DIR / dated_file,
+        MAX_ENTRIES_DIR / dated_file,
+        PAYOUTS_DIR / dated_file,
+        BOX_SCORES_DIR / iso_dated_file,
+        PROJECTIONS_DIR / iso_dated_file,
+    ]
+
+    if standings_bins and (sketch_file := get_standings_sketch_file(date, standings_bins)).exists():
+        day_files.append(sketch_file)
+    else:
+        day_files.append(STANDINGS_DIR / dated_file)
+
+    if (store_file := get_feature_store_file(get_season(date))).exists():
+        day_files.append(store_file)
+
+    return day_files
+
+
+def get_day_size(date: dt.datetime, standings_bins: int | None = None) -> int:
+    """Returns the number of bytes on disk `load_day` reads for `date`, a cheap proxy for how much memory it needs"""
+    return sum(day_file.stat().st_size for day_file in get_day_files(date, standings_bins) if day_file.exists())
+
+
+def load_standings_sketches(date: dt.datetime, payouts: pd.DataFrame, num_bins: int) -> Dict[int, StandingsSketch]:
+    """Sketches are built from the standings the first time a day is loaded and then read from the sketch file"""
+    sketch_file = get_standings_sketch_file(date, num_bins)
+
+    if sketch_file.exists():
+        return read_standings_sketches(sketch_file)
+
+    sketches = build_standings_sketches(read_standings(date), payouts, num_bins)
+    STANDINGS_SKETCHES_DIR.mkdir(parents=True, exist_ok=True)
+    write_standings_sketches(sketches, sketch_file)
+    return sketches
+
+
+def get_sketch_offsets(sketches: Dict[int, StandingsSketch]) -> pd.DataFrame:
+    """Returns the offsets the full standings would have, so contests still know their number of entries"""
+    contest_ids = sorted(sketches)
+    stops = np.cumsum([sketches[contest_id].num_entries for contest_id in contest_ids], dtype="int64")
+    starts = stops - [sketches[contest_id].num_entries for contest_id in contest_ids]
+    return pd.DataFrame({"start": starts, "stop": stops}, index=pd.Index(contest_ids, name="contest_id"))
+
+
+def get_feature_store_file(season: int) -> Path:
+    # stores built before players were keyed by team and name have a different file name, so they're rebuilt
+    return FEATURES_DIR / f"{season}-by-team.npz"
+
+
+def get_box_score_dates(season: int) -> List[dt.datetime]:
+    box_score_dates = [dt.datetime.strptime(file.stem, r"%Y-%m-%d") for file in BOX_SCORES_DIR.glob("*.csv")]
+    return sorted(date for date in box_score_dates if get_season(date) == season)
+
+
+def read_games(date: dt.datetime) -> pd.DataFrame:
+    """Returns the box score of every player that played on `date`, along with the projection they had for it"""
+    box_scores = read_box_scores(date)
+
+    # projections are matched on team and name, like the projections of contests
     try:
-        contests_details = read_contests_details(date)
-        competitions = read_competitions(date)
-        draftables = read_draftables(date)
-        lineup_reqs = read_lineup_reqs(date)
-        max_entries = read_max_entries(date)
-        payouts = read_payouts(date)
-        box_scores = read_box_scores(date)
-        draft_groups = read_draft_groups(date)
-        draft_group_games = read_draft_group_games(date)
-        standings = read_standings(date)
-        projections = read_projections(date)
+        projections = read_projections(date).droplevel("player_id").fpts
+        projected_fpts = projections.loc[~projections.index.duplicated()].reindex(box_scores.index).to_numpy()
     except FileNotFoundError:
-        return logger.info(f"Skipping {date}")
+        projected_fpts = np.nan
+
+    games = box_scores.assign(projected_fpts=projected_fpts).reset_index()
+    return games.assign(player=get_player_keys(games.team, games.name), date=date).set_index(["player", "date"])
+
+
+def update_feature_store(season: int) -> FeatureStore | None:
+    """
+    Adds every box score of `season` that isn't in the season's feature store yet, building the store the first time,
+    and returns the updated store (None if the season doesn't have any box scores)
+    """
+    store_file = get_feature_store_file(season)
+    store = read_feature_store(store_file) if store_file.exists() else None
+
+    built_dates = set() if store is None else set(pd.to_datetime(store.dates))
+    new_dates = [date for date in get_box_score_dates(season) if date not in built_dates]
+    if not new_dates:
+        return store
+
+    # only the new box scores are read, the games already in the store are reused
+    with ThreadPoolExecutor() as pool:
+        new_games = pd.concat(list(pool.map(read_games, new_dates)))
+
+    if store is None:
+        store = FeatureStore.from_games(new_games, new_dates)
+    else:
+        store = store.add_games(new_games, new_dates)
+
+    FEATURES_DIR.mkdir(parents=True, exist_ok=True)
+    write_feature_store(store, store_file)
+    logger.info(f"Added {len(new_dates)} dates to the {season} feature store, it holds {len(store.games)} games")
+    return store
+
+
+@lru_cache(maxsize=1)
+def load_feature_store(store_file: Path, modified_at: float) -> FeatureStore:
+    """Reads a feature store once per process, for as long as its file isn't modified"""
+    return read_feature_store(store_file)
+
+
+def get_draftable_features(date: dt.datetime, draftables: pd.DataFrame) -> pd.DataFrame | None:
+    """
+    Returns the features of every draftable as of the start of `date`, aligned with `draftables`, or None when the
+    season's feature store hasn't been built
+
+    Draftables are found in the store by team and name, falling back to the closest name on their team like the judge
+    does, since DraftKings and box scores don't always spell names the same
+    """
+    store_file = get_feature_store_file(get_season(date))
+    if not store_file.exists():
+        return None
+
+    store = load_feature_store(store_file, store_file.stat().st_mtime)
+    players = get_player_keys(draftables.team, draftables.name)
+    known_players = store.games.index.levels[0]
+
+    unmatched = draftables.loc[~players.isin(known_players), ["team", "name"]].drop_duplicates()
+    if len(unmatched):
+        matches = approximate_match(unmatched, store.get_players(), what="player", on="name", by=["team"])
+        renames = {key: match for key, match in zip(get_player_keys(unmatched.team, unmatched.name), matches) if match}
+        players = players.map(lambda player: renames.get(player, player))
+
+    # draftables without a match look the same as players without any games, so they're at least counted
+    missing = ~players.isin(known_players)
+    if missing.any():
+        logger.info(f"{missing.sum()}/{len(draftables)} draftables on {date:%Y-%m-%d} aren't in the feature store")
+
+    features = store.as_of(date, players)
+    features.index = draftables.index
+    return features
+
+
+def load_day(date: dt.datetime, standings_bins: int | None = None, max_workers: int | None = None) -> DayBundle:
+    """
+    Reads everything for a single day, with the tables read and parsed concurrently. If `standings_bins` is given, each
+    contest's standings are replaced by a `StandingsSketch` with that many bins for the unpaid entries
+    """
+    readers = {
+        "contests_details": read_contests_details,
+        "competitions": read_competitions,
+        "draft_groups": read_draft_groups,
+        "draft_group_games": read_draft_group_games,
+        "draftables": read_draftables,
+        "projection_table": read_projections,
+        "lineup_reqs": read_lineup_reqs,
+        "max_entries": read_max_entries,
+        "payouts": read_payouts,
+        "box_scores": read_box_scores,
+    }
+    if not standings_bins:
+        readers["standings"] = read_standings
+
+    with ThreadPoolExecutor(max_workers or len(readers)) as pool:
+        futures = {name: pool.submit(reader, date) for name, reader in readers.items()}
+        tables = {name: future.result() for name, future in futures.items()}
+
+    draftables = tables.pop("draftables").sort_index(level="draft_group_id", sort_remaining=False, kind="stable")
+    payouts = tables.pop("payouts").sort_index()
+
+    if standings_bins:
+        standings = None
+        standings_sketches = load_standings_sketches(date, payouts, standings_bins)
+        standing_offsets = get_sketch_offsets(standings_sketches)
+    else:
+        standings = tables.pop("standings").sort_index(level="contest_id", sort_remaining=False, kind="stable")
+        standings_sketches = None
+        standing_offsets = get_offsets(standings, "contest_id")
+
+    day = DayBundle(
+        date=date,
+        draftables=draftables,
+        draftable_offsets=get_offsets(draftables, "draft_group_id"),
+        projections=np.full(len(draftables), np.nan),
+        payouts=payouts,
+        payout_offsets=get_offsets(payouts, "contest_id"),
+        standings=standings,
+        standing_offsets=standing_offsets,
+        standings_sketches=standings_sketches,
+        features=get_draftable_features(date, draftables),
+        **tables,
+    )
+
+    memory_usage = get_memory_usage(day)
+    logger.info(
+        f"Loaded {date:%Y-%m-%d} in {memory_usage.sum() / 2**20:.1f} MiB ("
+        + ", ".join(f"{table} {size / 2**20:.1f} MiB" for table, size in memory_usage.head(5).items())
+        + ")"
+    )
+    return day
+
+
+def get_memory_usage(day: DayBundle) -> pd.Series:
+    """Returns the number of bytes used by each table of `day`, from largest to smallest"""
+    memory_usage = {}
+    for table in (field.name for field in fields(DayBundle)):
+        value = getattr(day, table)
+        if isinstance(value, pd.DataFrame):
+            memory_usage[table] = value.memory_usage(deep=True).sum()
+        elif isinstance(value, pd.Series):
+            memory_usage[table] = value.memory_usage(deep=True)
+        elif isinstance(value, np.ndarray):
+            memory_usage[table] = value.nbytes
+        elif isinstance(value, dict):
+            memory_usage[table] = sum(
+                sum(array.nbytes for array in (sketch.exact_points, sketch.bin_edges, sketch.bin_counts))
+                for sketch in value.values()
+            )
+
+    return pd.Series(memory_usage, name="bytes").sort_values(ascending=False)
+
+
+class DayPrefetcher:
+    """
+    Loads the days of a sequential backtest in the background, so reading and parsing the next days overlaps with
+    generating and judging lineups for the current one
+
+    At most `prefetch_days` days are loaded ahead of the day being backtested, which bounds the extra memory used. A day
+    that couldn't be loaded is handed out as None
+    """
+
+    def __init__(self, dates, prefetch_days: int, standings_bins: int | None = None):
+        self.dates = list(dates)
+        self.prefetch_days = prefetch_days
+        self.standings_bins = standings_bins
+
+    def load(self, date: dt.datetime) -> DayBundle | None:
+        try:
+            return load_day(date, self.standings_bins)
+        except FileNotFoundError:
+            return None
+
+    def __iter__(self) -> Iterator[Tuple[dt.datetime, DayBundle | None]]:
+        if self.prefetch_days < 1:
+            yield from ((date, self.load(date)) for date in self.dates)
+            return
+
+        with ThreadPoolExecutor(self.prefetch_days) as pool:
+            loading: Deque[Tuple[dt.datetime, Future]] = deque()
+            dates = iter(self.dates)
+
+            # the next date is submitted as each day is handed out, so `prefetch_days` are loading behind it
+            for date in itertools.islice(dates, self.prefetch_days):
+                loading.append((date, pool.submit(self.load, date)))
+
+            while loading:
+                date, future = loading.popleft()
+                day = future.result()
+                if (next_date := next(dates, None)) is not None:
+                    loading.append((next_date, pool.submit(self.load, next_date)))
+
+                yield date, day
+                del day
+
+
+def get_contests(
+    date: dt.datetime, standings_bins: int | None = None, day: DayBundle | None = None
+) -> Generator[Contest, None, None]:
+    """Yields the number of contests and then each contest of `date`, from `day` if it was already loaded"""
+    if day is None:
+        try:
+            day = load_day(date, standings_bins)
+        except FileNotFoundError:
+            return logger.info(f"Skipping {date}")
 
     # first, return number of contests
-    yield standings.index.get_level_values("contest_id").nunique()  # type: ignore
+    yield len(day.standing_offsets)  # type: ignore
 
-    for contest_id, contest_standings in standings.groupby(level="contest_id"):
+    projected_draft_groups: set[int] = set()
+    for contest_id in day.standing_offsets.index:
         try:
-            details: pd.Series = contests_details.loc[contest_id]  # type: ignore
-            draft_group = draft_groups.loc[details.draft_group_id]
-            contest_draftables = draftables.loc[details.draft_group_id]
+            details: pd.Series = day.contests_details.loc[contest_id]  # type: ignore
+            draft_group = day.draft_groups.loc[details.draft_group_id]
             contest_type_id = draft_group.contest_type_id
 
             # don't enter any multi-day competitions because we don't scrape projections for the next day
-            contest_competitions = draft_group_games.game_id.loc[[details.draft_group_id]]
-            competition_starts = competitions.starts_at.loc[contest_competitions]
+            contest_competitions = day.draft_group_games.game_id.loc[[details.draft_group_id]]
+            competition_starts = day.competitions.starts_at.loc[contest_competitions]
             if competition_starts.max().astimezone("EST").date() != date.date():
                 continue
 
@@ -226,17 +583,22 @@ def get_contests(date: dt.datetime) -> Generator[Contest, None, None]:
             ):
                 continue
 
-            yield Contest(
-                details=details,
-                draftables=contest_draftables,
-                draft_group=draft_group,
-                lineup_reqs=lineup_reqs.loc[draft_group.contest_type_id],
-                max_entries=max_entries.loc[contest_id],
-                payouts=payouts.loc[contest_id],
-                projections=get_contest_projections(contest_draftables, projections, contest_type_id),
-                standings=contest_standings,
-                box_scores=box_scores,
+            contest = Contest(
+                day,
+                contest_id=contest_id,
+                draft_group_id=details.draft_group_id,
+                contest_type_id=contest_type_id,
+                max_entries=day.max_entries.loc[contest_id],
             )
+
+            # projections only depend on the draft group, so they're shared by all contests in it
+            if contest.draft_group_id not in projected_draft_groups:
+                day.projections[contest.draftables_start : contest.draftables_stop] = get_contest_projections(
+                    contest.draftables, day.projection_table, contest_type_id
+                ).to_numpy()
+                projected_draft_groups.add(contest.draft_group_id)
+
+            yield contest
         except KeyError:
             # KeyError occurs when we have a contest in the standings, but no information about it
             logger.info(f"Skipping Contest #{contest_id}")
@@ -0,0 +1,156 @@
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List
+import datetime as dt
+import pandas as pd
+import numpy as np
+
+# the stats kept for every game a player played in, `projected_fpts` is the projection they had going into the game
+GAME_COLUMNS = ["fpts", "pts", "projected_fpts"]
+WINDOWS = (3, 5, 10)
+FEATURES = [
+    "games",
+    "last_fpts",
+    *(f"fpts_mean_{window}" for window in WINDOWS),
+    "fpts_std_10",
+    "fpts_season_mean",
+    "pts_mean_10",
+    "projection_error_10",
+]
+
+
+def get_player_keys(teams, names) -> pd.Index:
+    """Players are keyed by team and name, so players with the same name on different teams are kept apart"""
+    return pd.Index([f"{team}:{name}" for team, name in zip(teams, names)], dtype=object)
+
+
+def get_season(date: dt.datetime) -> int:
+    """Seasons are named after the year they start in, with the offseason counted as the start of the next one"""
+    return date.year if date.month >= 8 else date.year - 1
+
+
+def get_features(games: pd.DataFrame) -> pd.DataFrame:
+    """
+    Returns the rolling aggregates of each player's games up to and including each game, for `games` indexed by
+    ("player", "date") and sorted
+    """
+    by_player = games.groupby(level="player", sort=False)
+
+    def rolling(column: str | pd.Series, window: int, agg: str, min_periods: int = 1) -> np.ndarray:
+        values = games[column] if isinstance(column, str) else column
+        rolled = values.groupby(level="player", sort=False).rolling(window, min_periods=min_periods).agg(agg)
+        return rolled.droplevel(0).reindex(games.index).to_numpy(dtype="float32")
+
+    played = by_player.cumcount().to_numpy() + 1
+    features = {
+        "games": played,
+        "last_fpts": games.fpts.to_numpy(dtype="float32"),
+        **{f"fpts_mean_{window}": rolling("fpts", window, "mean") for window in WINDOWS},
+        "fpts_std_10": rolling("fpts", 10, "std", min_periods=2),
+        "fpts_season_mean": (by_player.fpts.cumsum().to_numpy() / played).astype("float32"),
+        "pts_mean_10": rolling("pts", 10, "mean"),
+        # how much the player beat their projections by, games without a projection are skipped
+        "projection_error_10": rolling(games.fpts - games.projected_fpts, 10, "mean"),
+    }
+    return pd.DataFrame(features, index=games.index)
+
+
+@dataclass
+class FeatureStore:
+    """
+    Every game of a season's players, indexed by ("player", "date") and sorted, with the rolling aggregates of each
+    player's games up to and including each one
+
+    Players are keyed by team and name (see `get_player_keys`), so a traded player starts a new history with their new
+    team. `dates` holds every date the store was built from, including the ones without any games
+    """
+
+    games: pd.DataFrame
+    dates: np.ndarray  # datetime64[D]
+    _keys: np.ndarray = field(init=False, repr=False)
+
+    def __post_init__(self):
+        # each game as one sortable key (player code, day), so a whole set of players is looked up with one search
+        days = self.games.index.get_level_values("date").to_numpy().astype("datetime64[D]").astype("int64")
+        self._keys = (self.games.index.codes[0].astype("int64") << 32) | days
+
+    @classmethod
+    def from_games(cls, games: pd.DataFrame, dates) -> "FeatureStore":
+        # rebuilding the index sorts its levels, so sorting by codes is the same as sorting by player
+        games = (
+            games.loc[:, GAME_COLUMNS]
+            .reset_index()
+            .astype({"player": str, "date": "datetime64[ns]"})
+            .set_index(["player", "date"])
+            .sort_index()
+        )
+        return cls(
+            pd.concat([games, get_features(games)], axis=1),
+            np.unique(np.asarray(dates, dtype="datetime64[D]")),
+        )
+
+    def add_games(self, games: pd.DataFrame, dates) -> "FeatureStore":
+        """
+        Returns a store with `games` (read on `dates`) added. Only the new games have to be read, but every
+        aggregate is recomputed since a date can be added before ones that are already in the store
+        """
+        return FeatureStore.from_games(
+            pd.concat([self.games.loc[:, GAME_COLUMNS], games]),
+            np.concatenate([self.dates, np.asarray(dates, dtype="datetime64[D]")]),
+        )
+
+    def get_players(self) -> pd.DataFrame:
+        """Returns the team and name of every player in the store, along with their key"""
+        players = self.games.index.levels[0].to_series(index=None, name="player")
+        return players.str.split(":", n=1, expand=True).set_axis(["team", "name"], axis=1).assign(player=players)
+
+    def as_of(self, date: dt.datetime, players) -> pd.DataFrame:
+        """
+        Returns the features of each of `players` as of the start of `date`, from their last game strictly before it,
+        so nothing that happened on or after `date` can leak in
+
+        Players without a game before `date` get NaN features and 0 `games`
+        """
+        players = pd.Index(players)
+        codes = self.games.index.levels[0].get_indexer(players.astype(str)).astype("int64")
+        day = np.datetime64(pd.Timestamp(date).date(), "D").astype("int64")
+
+        # the last game of each player before `date` is the one right before where `date` would be inserted
+        rows = np.searchsorted(self._keys, (codes << 32) | day, side="left") - 1
+        found = (codes >= 0) & (rows >= 0) & ((self._keys[rows.clip(0)] >> 32) == codes)
+        rows = rows.clip(0)
+
+        features = pd.DataFrame(
+            {name: np.where(found, self.games[name].to_numpy()[rows], np.nan).astype("float32") for name in FEATURES},
+            index=players,
+        )
+        features["games"] = features.games.fillna(0).astype("int16")
+        features["days_rest"] = np.where(found, day - (self._keys[rows] & 0xFFFFFFFF), np.nan).astype("float32")
+        return features
+
+
+def write_feature_store(store: FeatureStore, store_file: Path) -> None:
+    np.savez_compressed(
+        store_file,
+        players=store.games.index.levels[0].to_numpy(dtype=str),
+        player_codes=store.games.index.codes[0],
+        game_dates=store.games.index.get_level_values("date").to_numpy().astype("datetime64[D]"),
+        dates=store.dates,
+        **{column: store.games[column].to_numpy() for column in store.games.columns},
+    )
+
+
+def read_feature_store(store_file: Path) -> FeatureStore:
+    with np.load(store_file) as store_data:
+        store_arrays = {name: store_data[name] for name in store_data.files}
+
+    index = pd.MultiIndex.from_arrays(
+        [
+            store_arrays.pop("players").astype(object)[store_arrays.pop("player_codes")],
+            pd.DatetimeIndex(store_arrays.pop("game_dates").astype("datetime64[ns]")),
+        ],
+        names=["player", "date"],
+    )
+    dates = store_arrays.pop("dates")
+    columns: List[str] = [*GAME_COLUMNS, *FEATURES]
+    return FeatureStore(pd.DataFrame({column: store_arrays[column] for column in columns}, index=index), dates)
@@ -0,0 +1,179 @@
+# Share a loaded day with other processes through shared memory, so they don't have to load or unpickle it themselves
+
+from ifonly import DayBundle, register_day
+from multiprocessing.shared_memory import SharedMemory
+from contextlib import contextmanager
+from dataclasses import fields
+from typing import Any, Dict, Iterator, List
+import pandas as pd
+import numpy as np
+import pickle
+
+ALIGNMENT = 64
+HEADER_SIZE = 8  # the length of the pickled header, which is followed by the arrays
+
+# shared memory that this process attached to, kept open for as long as the process uses the day
+_attached: Dict[str, SharedMemory] = {}
+
+
+class _Encoder:
+    """
+    Splits pandas objects into numeric arrays, which are placed in shared memory, and a header describing how to put
+    them back together. Anything that isn't numeric (e.g. the names of contests) is small and pickled into the header
+    """
+
+    def __init__(self):
+        self.arrays: List[np.ndarray] = []
+        self.size = 0
+
+    def add_array(self, array: np.ndarray) -> dict:
+        array = np.ascontiguousarray(array)
+        offset = -(-self.size // ALIGNMENT) * ALIGNMENT
+        self.arrays.append(array)
+        self.size = offset + array.nbytes
+        return {"offset": offset, "dtype": array.dtype.str, "shape": array.shape}
+
+    def encode_values(self, values: Any) -> dict:
+        if isinstance(values, pd.MultiIndex):
+            return {
+                "levels": [self.encode_values(level) for level in values.levels],
+                "codes": [self.add_array(codes) for codes in values.codes],
+                "names": list(values.names),
+            }
+        if isinstance(values, pd.RangeIndex):
+            return {"range": (values.start, values.stop, values.step), "name": values.name}
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            return {
+                "codes": self.add_array(values.cat.codes if isinstance(values, pd.Series) else values.codes),
+                "categories": self.encode_values(values.dtype.categories),
+                "ordered": values.dtype.ordered,
+                "name": values.name,
+            }
+        if isinstance(values.dtype, np.dtype) and values.dtype.kind in "biuf":
+            return {"array": self.add_array(np.asarray(values)), "name": getattr(values, "name", None)}
+
+        # columns are pickled as arrays, so they aren't aligned with their original index when they're decoded
+        return {"pickled": values.array if isinstance(values, pd.Series) else values}
+
+    def encode(self, value: Any) -> dict:
+        if isinstance(value, pd.DataFrame):
+            return {
+                "frame": [(column, self.encode_values(value[column])) for column in value.columns],
+                "index": self.encode_values(value.index),
+            }
+        if isinstance(value, pd.Series):
+            return {
+                "series": self.encode_values(value.reset_index(drop=True)),
+                "index": self.encode_values(value.index),
+            }
+        if isinstance(value, np.ndarray) and value.dtype.kind in "biuf":
+            return {"ndarray": self.add_array(value)}
+
+        return {"pickled": value}
+
+
+def _decode_array(buffer: memoryview, spec: dict) -> np.ndarray:
+    return np.ndarray(spec["shape"], dtype=np.dtype(spec["dtype"]), buffer=buffer, offset=spec["offset"])
+
+
+def _decode_values(buffer: memoryview, spec: dict, index: bool = False) -> Any:
+    if "levels" in spec:
+        return pd.MultiIndex(
+            levels=[_decode_values(buffer, level, index=True) for level in spec["levels"]],
+            codes=[_decode_array(buffer, codes) for codes in spec["codes"]],
+            names=spec["names"],
+            verify_integrity=False,
+        )
+    if "range" in spec:
+        return pd.RangeIndex(*spec["range"], name=spec["name"])
+    if "pickled" in spec:
+        return spec["pickled"]
+
+    if "categories" in spec:
+        categories = _decode_values(buffer, spec["categories"], index=True)
+        values = pd.Categorical.from_codes(_decode_array(buffer, spec["codes"]), categories, spec["ordered"])
+    else:
+        values = _decode_array(buffer, spec["array"])
+
+    if index:
+        return pd.Index(values, name=spec["name"], copy=False)
+    return values
+
+
+def _decode(buffer: memoryview, spec: dict) -> Any:
+    if "frame" in spec:
+        columns = {column: _decode_values(buffer, column_spec) for column, column_spec in spec["frame"]}
+        return pd.DataFrame(columns, index=_decode_values(buffer, spec["index"], index=True), copy=False)
+    if "series" in spec:
+        series_spec = spec["series"]
+        index = _decode_values(buffer, spec["index"], index=True)
+        return pd.Series(_decode_values(buffer, series_spec), index=index, name=series_spec["name"], copy=False)
+    if "ndarray" in spec:
+        return _decode_array(buffer, spec["ndarray"])
+
+    return spec["pickled"]
+
+
+def share_day(day: DayBundle) -> SharedMemory:
+    """
+    Copies `day` into a new block of shared memory, which other processes can attach to by name with `attach_day`
+
+    The caller owns the block, and has to close and unlink it once no process needs the day anymore
+    """
+    encoder = _Encoder()
+    header = pickle.dumps(
+        {field.name: encoder.encode(getattr(day, field.name)) for field in fields(DayBundle)},
+        protocol=pickle.HIGHEST_PROTOCOL,
+    )
+    data_start = -(-(HEADER_SIZE + len(header)) // ALIGNMENT) * ALIGNMENT
+
+    shared_memory = SharedMemory(create=True, size=max(data_start + encoder.size, 1))
+    buffer = shared_memory.buf
+    assert buffer is not None  # only None once the block is closed
+    buffer[:HEADER_SIZE] = len(header).to_bytes(HEADER_SIZE, "little")
+    buffer[HEADER_SIZE : HEADER_SIZE + len(header)] = header
+
+    data = buffer[data_start:]
+    offset = 0
+    for array in encoder.arrays:
+        offset = -(-offset // ALIGNMENT) * ALIGNMENT
+        data[offset : offset + array.nbytes] = array.view("uint8").ravel().data
+        offset += array.nbytes
+
+    # contests of the day pickled from now on are attached to the shared copy when they're unpickled
+    register_day(day, shared_memory.name)
+    return shared_memory
+
+
+def attach_day(name: str) -> DayBundle:
+    """
+    Returns the day in the shared memory block called `name`, without copying any of its arrays
+
+    The day's tables are views of memory shared with other processes, so they must not be modified
+    """
+    if name not in _attached:
+        # workers are children of the process that shared the day, so they share its resource tracker and attaching
+        # doesn't make them unlink the day when they exit
+        _attached[name] = SharedMemory(name=name)
+
+    buffer = _attached[name].buf
+    assert buffer is not None  # only None once the block is closed
+    header_length = int.from_bytes(buffer[:HEADER_SIZE], "little")
+    header = pickle.loads(buffer[HEADER_SIZE : HEADER_SIZE + header_length])
+    data_start = -(-(HEADER_SIZE + header_length) // ALIGNMENT) * ALIGNMENT
+
+    data = buffer[data_start:]
+    day = DayBundle(**{field: _decode(data, spec) for field, spec in header.items()})
+    register_day(day, name)
+    return day
+
+
+@contextmanager
+def shared_day(day: DayBundle) -> Iterator[str]:
+    """Shares `day` for the duration of the context, yielding the name to attach to it with"""
+    shared_memory = share_day(day)
+    try:
+        yield shared_memory.name
+    finally:
+        shared_memory.close()
+        shared_memory.unlink()
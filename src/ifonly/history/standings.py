@@ -0,0 +1,112 @@
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Tuple
+import pandas as pd
+import numpy as np
+
+
+@dataclass(slots=True)
+class StandingsSketch:
+    """
+    A compact stand-in for one contest's standings
+
+    Every score in the paid region (the best `maxPosition` entries) is kept exactly, so places that decide a payout are
+    exact. The scores of the rest of the entries are only kept as a histogram, so places outside of the paid region
+    are estimates with a known maximum error
+    """
+
+    exact_points: np.ndarray  # the scores of the paid region, in descending order
+    bin_edges: np.ndarray
+    bin_counts: np.ndarray  # the number of unpaid entries in each bin, the last bin includes its right edge
+    num_entries: int
+
+    @classmethod
+    def from_points(cls, points: np.ndarray, paid_places: int, num_bins: int) -> "StandingsSketch":
+        points = np.sort(np.asarray(points, dtype="float64"))[::-1]
+        exact_points, unpaid_points = points[:paid_places], points[paid_places:]
+
+        if len(unpaid_points):
+            bin_counts, bin_edges = np.histogram(unpaid_points, bins=num_bins)
+        else:
+            bin_counts, bin_edges = np.zeros(num_bins, dtype="int64"), np.zeros(num_bins + 1)
+
+        return cls(exact_points, bin_edges, bin_counts.astype("int32"), len(points))
+
+    def get_places(self, scores: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the place each score would have taken in the contest, the same as ranking against the full standings
+
+        Returns
+        -------
+        places: np.ndarray
+            The (estimated) place of each score
+        place_errors: np.ndarray
+            The most each place could be off by, 0 for every place in the paid region
+        """
+        scores = np.asarray(scores, dtype="float64")
+
+        # a score's place is 1 + the number of entries that scored at least as much
+        num_exact_above = np.searchsorted(-self.exact_points, -scores, side="right")
+
+        num_unpaid = int(self.bin_counts.sum())
+        unpaid_floor = self.exact_points[-1] if len(self.exact_points) else np.inf
+        in_unpaid_region = (scores <= unpaid_floor) & (num_unpaid > 0)
+
+        # every entry in the bins after a score's bin scored more, only the entries in its bin are uncertain
+        edges, counts = self.bin_edges, self.bin_counts
+        bins = np.clip(np.searchsorted(edges, scores, side="right") - 1, 0, len(counts) - 1)
+        num_after = np.append(np.cumsum(counts[::-1])[::-1], 0)[bins + 1]
+        bin_widths = edges[bins + 1] - edges[bins]
+        above_in_bin = np.clip(
+            np.divide(edges[bins + 1] - scores, bin_widths, where=bin_widths > 0, out=np.ones_like(scores)), 0, 1
+        )
+
+        lower = np.where(scores <= edges[0], num_unpaid, np.where(scores > edges[-1], 0, num_after))
+        upper = np.where((scores <= edges[0]) | (scores > edges[-1]), lower, num_after + counts[bins])
+        estimate = np.round(np.where(upper > lower, num_after + above_in_bin * counts[bins], lower))
+
+        num_unpaid_above = np.where(in_unpaid_region, estimate, 0).astype("int64")
+        place_errors = np.where(in_unpaid_region, np.maximum(estimate - lower, upper - estimate), 0).astype("int64")
+
+        return 1 + num_exact_above + num_unpaid_above, place_errors
+
+
+def build_standings_sketches(
+    standings: pd.DataFrame, payouts: pd.DataFrame, num_bins: int
+) -> Dict[int, StandingsSketch]:
+    paid_places = payouts.maxPosition.groupby(level="contest_id").max()
+
+    return {
+        contest_id: StandingsSketch.from_points(points.to_numpy(), int(paid_places.get(contest_id, 0)), num_bins)
+        for contest_id, points in standings.Points.groupby(level="contest_id")
+    }
+
+
+def write_standings_sketches(sketches: Dict[int, StandingsSketch], sketch_file: Path) -> None:
+    exact_points = [sketch.exact_points for sketch in sketches.values()]
+
+    np.savez_compressed(
+        sketch_file,
+        contest_ids=np.fromiter(sketches, dtype="int64", count=len(sketches)),
+        num_entries=np.array([sketch.num_entries for sketch in sketches.values()], dtype="int64"),
+        exact_offsets=np.cumsum([0] + [len(points) for points in exact_points]),
+        exact_points=np.concatenate(exact_points) if exact_points else np.empty(0),
+        bin_edges=np.array([sketch.bin_edges for sketch in sketches.values()]),
+        bin_counts=np.array([sketch.bin_counts for sketch in sketches.values()]),
+    )
+
+
+def read_standings_sketches(sketch_file: Path) -> Dict[int, StandingsSketch]:
+    with np.load(sketch_file) as sketch_data:
+        sketch_arrays = {name: sketch_data[name] for name in sketch_data.files}
+
+    offsets = sketch_arrays["exact_offsets"]
+    return {
+        int(contest_id): StandingsSketch(
+            sketch_arrays["exact_points"][offsets[i] : offsets[i + 1]],
+            sketch_arrays["bin_edges"][i],
+            sketch_arrays["bin_counts"][i],
+            int(sketch_arrays["num_entries"][i]),
+        )
+        for i, contest_id in enumerate(sketch_arrays["contest_ids"])
+    }
@@ -0,0 +1,343 @@
+# A job queue for spreading backtests across processes and machines, brokered by a SQLite database on shared storage
+
+from ifonly.backtest import backtest_contests, write_results
+from ifonly.history.contests import read_draft_groups
+from ifonly.utils.logs import logging_listener
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator, List
+import datetime as dt
+import pandas as pd
+import threading
+import shutil
+import sqlite3
+import socket
+import json
+import time
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY,
+    parameters TEXT NOT NULL,
+    planned_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id INTEGER NOT NULL REFERENCES runs (run_id),
+    date TEXT NOT NULL,
+    draft_group_id INTEGER,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_expires_at REAL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, lease_expires_at);
+CREATE TABLE IF NOT EXISTS contest_summaries (
+    job_id INTEGER NOT NULL REFERENCES jobs (job_id),
+    date TEXT NOT NULL,
+    run_id INTEGER,
+    contest_id INTEGER,
+    contest_type_id INTEGER,
+    entries INTEGER,
+    entry_fee REAL,
+    prize_pool REAL,
+    algorithm TEXT,
+    lineup_num INTEGER,
+    fpts REAL,
+    place INTEGER,
+    place_error INTEGER,
+    payout REAL
+);
+"""
+
+# the directories a run writes its files to besides the contest summaries, and their subdirectories of the results dir
+RESULTS_DIRS = {"lineups_dir": "lineups", "telemetry_dir": "telemetry", "swaps_dir": "swaps"}
+
+SUMMARY_COLUMNS = [
+    "run_id",
+    "contest_id",
+    "contest_type_id",
+    "entries",
+    "entry_fee",
+    "prize_pool",
+    "algorithm",
+    "lineup_num",
+    "fpts",
+    "place",
+    "place_error",
+    "payout",
+]
+
+
+@dataclass
+class Job:
+    job_id: int
+    run_id: int
+    date: dt.datetime
+    draft_group_id: int | None
+    attempts: int
+
+
+@contextmanager
+def connect(database: str | Path) -> Iterator[sqlite3.Connection]:
+    # autocommit mode, transactions are started explicitly with BEGIN IMMEDIATE so leases can't race
+    con = sqlite3.connect(database, timeout=60, isolation_level=None)
+    try:
+        con.execute("PRAGMA busy_timeout = 60000")
+        yield con
+    finally:
+        con.close()
+
+
+def plan(database: str | Path, parameters: dict, by: str = "date", results_dir: str | Path | None = None) -> int:
+    """
+    Enqueues a job for each date of the run, or for each draft group of each date if `by` is "draft_group"
+
+    If `results_dir` is given, workers write the run's lineups, telemetry and swaps under it instead of their own
+    `results/` so they can be collected from any machine
+
+    Returns
+    -------
+    num_jobs: int
+        The number of jobs that were enqueued
+    """
+    jobs: List[tuple] = []
+    for date in parameters["dates"]:
+        if by == "date":
+            jobs.append((parameters["run_id"], f"{date:%Y-%m-%d}", None))
+            continue
+
+        try:
+            draft_group_ids = read_draft_groups(date).index.unique()
+        except FileNotFoundError:
+            logger.info(f"Skipping {date}")
+            continue
+
+        jobs.extend(
+            (parameters["run_id"], f"{date:%Y-%m-%d}", int(draft_group_id)) for draft_group_id in draft_group_ids
+        )
+
+    # dates are rebuilt from the jobs, everything else is what every worker runs the jobs with
+    run_parameters = {key: value for key, value in parameters.items() if key != "dates"}
+    if results_dir is not None:
+        run_parameters.update({key: str(Path(results_dir) / name) for key, name in RESULTS_DIRS.items()})
+
+    with connect(database) as con:
+        con.executescript(SCHEMA)
+        con.execute("BEGIN IMMEDIATE")
+        con.execute(
+            "INSERT INTO runs (run_id, parameters, planned_at) VALUES (?, ?, ?)",
+            (parameters["run_id"], json.dumps(run_parameters, default=str), time.time()),
+        )
+        con.executemany("INSERT INTO jobs (run_id, date, draft_group_id) VALUES (?, ?, ?)", jobs)
+        con.execute("COMMIT")
+
+    logger.info(f"Planned {len(jobs)} jobs for run {parameters['run_id']}")
+    return len(jobs)
+
+
+def lease_job(con: sqlite3.Connection, worker: str, lease_seconds: float, max_attempts: int) -> Job | None:
+    """Leases the oldest job that's pending or whose lease expired without its worker finishing it"""
+    now = time.time()
+
+    con.execute("BEGIN IMMEDIATE")
+    try:
+        row = con.execute(
+            """
+            SELECT job_id, run_id, date, draft_group_id, attempts FROM jobs
+            WHERE (status = 'pending' OR (status = 'leased' AND lease_expires_at < ?)) AND attempts < ?
+            ORDER BY job_id LIMIT 1
+            """,
+            (now, max_attempts),
+        ).fetchone()
+
+        if row is not None:
+            con.execute(
+                "UPDATE jobs SET status = 'leased', worker = ?, lease_expires_at = ?, attempts = attempts + 1 "
+                "WHERE job_id = ?",
+                (worker, now + lease_seconds, row[0]),
+            )
+
+        # jobs that ran out of attempts are failed so `has_unfinished_jobs` stops waiting on them
+        con.execute(
+            "UPDATE jobs SET status = 'failed' WHERE status = 'leased' AND lease_expires_at < ? AND attempts >= ?",
+            (now, max_attempts),
+        )
+        con.execute("COMMIT")
+    except BaseException:
+        con.execute("ROLLBACK")
+        raise
+
+    if row is None:
+        return None
+
+    job_id, run_id, date, draft_group_id, attempts = row
+    return Job(job_id, run_id, dt.datetime.fromisoformat(date), draft_group_id, attempts + 1)
+
+
+def has_unfinished_jobs(con: sqlite3.Connection) -> bool:
+    return con.execute("SELECT 1 FROM jobs WHERE status IN ('pending', 'leased') LIMIT 1").fetchone() is not None
+
+
+def get_run_parameters(con: sqlite3.Connection, run_id: int) -> dict:
+    (parameters,) = con.execute("SELECT parameters FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+    return json.loads(parameters)
+
+
+def complete_job(con: sqlite3.Connection, job: Job, worker: str, contest_summaries: pd.DataFrame | None) -> bool:
+    """
+    Stores the results of a job and marks it as done, unless the lease was lost to another worker in the meantime
+
+    Returns
+    -------
+    completed: bool
+        Whether this worker still held the lease
+    """
+    con.execute("BEGIN IMMEDIATE")
+    try:
+        updated = con.execute(
+            "UPDATE jobs SET status = 'done', lease_expires_at = NULL WHERE job_id = ? AND worker = ? "
+            "AND status IN ('leased', 'failed')",
+            (job.job_id, worker),
+        ).rowcount
+
+        if updated and contest_summaries is not None:
+            rows = contest_summaries.reindex(columns=SUMMARY_COLUMNS).to_numpy(dtype=object).tolist()
+            con.executemany(
+                f"INSERT INTO contest_summaries (job_id, date, {', '.join(SUMMARY_COLUMNS)}) "
+                f"VALUES (?, ?, {', '.join('?' * len(SUMMARY_COLUMNS))})",
+                [(job.job_id, f"{job.date:%Y-%m-%d}", *row) for row in rows],
+            )
+        con.execute("COMMIT")
+    except BaseException:
+        con.execute("ROLLBACK")
+        raise
+
+    return bool(updated)
+
+
+def fail_job(con: sqlite3.Connection, job: Job, worker: str, error: str, max_attempts: int) -> None:
+    status = "failed" if job.attempts >= max_attempts else "pending"
+    con.execute(
+        "UPDATE jobs SET status = ?, lease_expires_at = NULL, error = ? WHERE job_id = ? AND worker = ?",
+        (status, error, job.job_id, worker),
+    )
+
+
+class Heartbeat:
+    """Extends a job's lease in the background for as long as the worker is running it"""
+
+    def __init__(self, database: str | Path, job: Job, worker: str, lease_seconds: float):
+        self.database = database
+        self.job = job
+        self.worker = worker
+        self.lease_seconds = lease_seconds
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.beat, daemon=True)
+
+    def beat(self) -> None:
+        with connect(self.database) as con:
+            while not self.stopped.wait(self.lease_seconds / 3):
+                con.execute(
+                    "UPDATE jobs SET lease_expires_at = ? WHERE job_id = ? AND worker = ? AND status = 'leased'",
+                    (time.time() + self.lease_seconds, self.job.job_id, self.worker),
+                )
+
+    def __enter__(self) -> "Heartbeat":
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.stopped.set()
+        self.thread.join()
+
+
+def work(
+    database: str | Path,
+    lease_seconds: float = 300,
+    max_attempts: int = 3,
+    poll_seconds: float = 5,
+    worker: str | None = None,
+) -> int:
+    """
+    Runs jobs from the queue until there aren't any left, including the ones other workers are still running in case
+    their leases expire
+
+    Returns
+    -------
+    num_jobs: int
+        The number of jobs this worker completed
+    """
+    worker = worker or f"{socket.gethostname()}:{os.getpid()}"
+    num_jobs = 0
+
+    with connect(database) as con:
+        while True:
+            job = lease_job(con, worker, lease_seconds, max_attempts)
+
+            if job is None:
+                if not has_unfinished_jobs(con):
+                    break
+                time.sleep(poll_seconds)
+                continue
+
+            parameters = get_run_parameters(con, job.run_id)
+            draft_group_ids = None if job.draft_group_id is None else {job.draft_group_id}
+
+            # a worker can run jobs of many runs, each job is logged to the log file of its own run
+            log_config = parameters.get("logging", {})
+            with logging_listener(
+                job.run_id,
+                log_config.get("log_dir", "results/logs"),
+                log_config.get("level", "INFO"),
+                log_config.get("buffer_records", 1000),
+            ):
+                logger.info(f"{worker} running job {job.job_id} ({job.date:%Y-%m-%d}, attempt {job.attempts})")
+
+                try:
+                    with Heartbeat(database, job, worker, lease_seconds):
+                        contest_summaries = backtest_contests(job.date, parameters, draft_group_ids=draft_group_ids)
+                except Exception as e:
+                    logger.exception(f"{worker} failed job {job.job_id}")
+                    fail_job(con, job, worker, repr(e), max_attempts)
+                    continue
+
+                if complete_job(con, job, worker, contest_summaries):
+                    num_jobs += 1
+                else:
+                    logger.warning(f"{worker} lost the lease on job {job.job_id}, its results were discarded")
+
+    return num_jobs
+
+
+def collect(database: str | Path, run_id: int, parameters: dict) -> None:
+    """
+    Writes the results of a run to the results directory, the same as if it ran with `python -m ifonly`
+
+    Lineups, telemetry and swaps are copied from where the run's workers wrote them to the directories in `parameters`
+    so `rejudge --run-id` and `tune --run-id` find them
+    """
+    with connect(database) as con:
+        run_parameters = get_run_parameters(con, run_id)
+        statuses = dict(con.execute("SELECT status, COUNT(*) FROM jobs WHERE run_id = ? GROUP BY status", (run_id,)))
+        contest_summaries = pd.read_sql(
+            "SELECT * FROM contest_summaries WHERE run_id = ? ORDER BY job_id", con, params=(run_id,)
+        )
+
+    if set(statuses) - {"done"}:
+        logger.warning(f"Collecting run {run_id} before all of its jobs are done: {statuses}")
+
+    for date, date_summaries in contest_summaries.groupby("date"):
+        write_results(date_summaries.loc[:, SUMMARY_COLUMNS].reset_index(drop=True), pd.Timestamp(date))
+
+    for key, name in RESULTS_DIRS.items():
+        source = Path(run_parameters.get(key, f"results/{name}")) / str(run_id)
+        destination = Path(parameters.get(key, f"results/{name}")) / str(run_id)
+        if source.is_dir() and source.resolve() != destination.resolve():
+            shutil.copytree(source, destination, dirs_exist_ok=True)
@@ -1,15 +1,24 @@
 # Judge generated lineups against historical results
 
 import pandas as pd
+import numpy as np
+from typing import Tuple
 from ifonly import Contest
+from ifonly.lineups.batch import LineupBatch, PADDING
 from ifonly.utils.matcher import approximate_match
 
 
-def score_lineups(lineups: pd.DataFrame, box_scores: pd.DataFrame, contest_type_id: int) -> pd.Series:
+def score_draftables(
+    draftables: pd.DataFrame, box_scores: pd.DataFrame, contest_type_id: int, approximate: bool = True
+) -> pd.Series:
+    """
+    Scores each of `draftables` from the box score of their team and name, falling back to the closest name on their
+    team. Without `approximate`, draftables without a box score under their exact name are scored as not having played
+    """
     projection_col = "pts" if contest_type_id == 335 else "fpts"
 
     player_pts = pd.merge(
-        lineups,
+        draftables,
         box_scores,
         left_on=["team", "name"],
         right_index=True,
@@ -18,57 +27,93 @@ def score_lineups(lineups: pd.DataFrame, box_scores: pd.DataFrame, contest_type_
     ).loc[:, projection_col]
 
     unmatched_mask = player_pts.isna()
-    unmatched_players = lineups.loc[unmatched_mask]
-    player_pts.loc[unmatched_mask] = approximate_match(
-        unmatched_players,
-        box_scores.reset_index(),
-        what=projection_col,
-        on="name",
-        by=["team"],
-    ).fillna(0)
+    if approximate:
+        unmatched_players = draftables.loc[unmatched_mask]
+        player_pts.loc[unmatched_mask] = approximate_match(
+            unmatched_players,
+            box_scores.reset_index(),
+            what=projection_col,
+            on="name",
+            by=["team"],
+        ).fillna(0)
+    else:
+        player_pts.loc[unmatched_mask] = 0
 
     # TODO: double check that "Summer League Showdown Captain Mode" also uses roster_slot_id 476 for CPT or just skip
     # summer league contests
 
     # add 1.5x multiplier for CPT position in "Showdown Captain Mode" competitions
-    cpt_multiplier = 1 + 0.5 * lineups.roster_slot_id.eq(476)
+    cpt_multiplier = 1 + 0.5 * draftables.roster_slot_id.eq(476)
     player_pts *= cpt_multiplier
 
     # TODO: remove once i'm sure approximate match works as intended
     if player_pts.isna().any():
         breakpoint()
 
-    return player_pts.groupby(level=["algorithm", "lineup_num"]).sum()
+    return player_pts
 
 
-def rank_lineups(lineups: pd.DataFrame, contest: Contest) -> pd.DataFrame:
-    lineup_scores = score_lineups(lineups, contest.box_scores, contest.draft_group.contest_type_id)
+def score_lineups(lineups: LineupBatch, contest: Contest) -> pd.Series:
+    contest_type_id = contest.draft_group.contest_type_id
+    projection_col = "pts" if contest_type_id == 335 else "fpts"
+
+    # only score the draftables that were actually drafted, the extra trailing 0 is what padding positions pick up
+    drafted = np.unique(lineups.positions[lineups.positions != PADDING])
+    draftable_pts = np.zeros(len(contest.draftables) + 1)
+    draftable_pts[drafted] = score_draftables(
+        contest.draftables.iloc[drafted], contest.box_scores, contest_type_id
+    ).to_numpy()
+
+    return pd.Series(draftable_pts[lineups.positions].sum(axis=1), index=lineups.index, name=projection_col)
+
 
-    standings = contest.standings.Points
-    if standings.is_monotonic_decreasing:
-        standings = standings.iloc[::-1]
-    elif not standings.is_monotonic_increasing:
-        standings = standings.sort_values(ascending=True)
+def get_places(scores: np.ndarray, contest: Contest) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the place each score would have taken in the contest, and how far off each place could be (which is only
+    non-zero for places outside the paid region of sketched standings)
+    """
+    # sketched standings are only exact in the paid region, `place_error` is how far off each place could be
+    if (standings_sketch := contest.standings_sketch) is not None:
+        return standings_sketch.get_places(scores)
 
-    ranks = pd.Series(standings.searchsorted(lineup_scores), index=lineup_scores.index, name="rank")
+    standings = contest.standings_points
+    if np.all(standings[:-1] >= standings[1:]):
+        standings = standings[::-1]
+    elif not np.all(standings[:-1] <= standings[1:]):
+        standings = np.sort(standings)
+
+    ranks = standings.searchsorted(scores)
 
     places = (standings.size + 1) - ranks
 
-    return lineup_scores.to_frame().assign(place=places)
+    return places, np.zeros(len(places), dtype="int64")
 
 
-def get_contest_payouts(lineups: pd.DataFrame, contest: Contest) -> pd.DataFrame:
-    places = rank_lineups(lineups, contest)
+def lookup_payouts(places: np.ndarray, contest: Contest) -> np.ndarray:
+    """Returns the payout of each place, 0 for places that aren't paid"""
+    payouts = contest.payouts.sort_index()
+    if payouts.empty:
+        return np.zeros(len(places))
 
-    # if we got a payout it would be here, if we didn't get a payoff, we need to check
-    # that the max_position is less than what we ranked
-    potential_payouts = pd.merge_asof(
-        places.sort_values("place"),
-        contest.payouts.sort_index(),
-        left_on="place",
-        right_index=True,
-    )
+    min_positions = payouts.index.to_numpy()
+    max_positions = payouts.maxPosition.to_numpy()
 
-    actual_payouts = potential_payouts.payout.where(potential_payouts.place <= potential_payouts.maxPosition, 0)
+    # the payout tier of a place is the last one that starts at or before it, if the place is within the tier
+    tiers = np.searchsorted(min_positions, places, side="right") - 1
+    paid = (tiers >= 0) & (places <= max_positions[np.maximum(tiers, 0)])
 
-    return places.assign(payout=actual_payouts)
+    return np.where(paid, payouts.payout.to_numpy(dtype="float64")[np.maximum(tiers, 0)], 0.0)
+
+
+def rank_lineups(lineups: LineupBatch, contest: Contest) -> pd.DataFrame:
+    lineup_scores = score_lineups(lineups, contest)
+    places, place_errors = get_places(lineup_scores.to_numpy(), contest)
+    return lineup_scores.to_frame().assign(place=places, place_error=place_errors)
+
+
+def get_contest_payouts(lineups: LineupBatch | pd.DataFrame, contest: Contest) -> pd.DataFrame:
+    if isinstance(lineups, pd.DataFrame):
+        lineups = LineupBatch.from_frame(lineups, contest.draftables)
+
+    places = rank_lineups(lineups, contest)
+    return places.assign(payout=lookup_payouts(places.place.to_numpy(), contest))
@@ -1,39 +1,28 @@
 from ifonly.lineups.algorithms import Algorithm
-import sys
-import glob
-import os
-import inspect
 import importlib
 
+# Algorithms are declared as "module:class" so that an algorithm's module (and its dependencies, like Pyomo) is only
+# imported when the algorithm is enabled with `run = true` in ifonly.toml
+ALGORITHMS = {
+    "maximize_ev": "ifonly.lineups.algorithms.maximize_ev:MaximizeEVAlgorithm",
+    "maximize_ev_sampler": "ifonly.lineups.algorithms.maximize_ev_sampler:MaximizeEVSamplerAlgorithm",
+    "random_sampler": "ifonly.lineups.algorithms.random_sampler:RandomAlgorithm",
+}
 
-def import_all_from_directory(directory):
-    # Add directory to sys.path so it can be imported
-    sys.path.insert(0, directory)
 
-    # Import all modules in the directory
-    algorithms: set[Algorithm] = set()
-    for filepath in glob.glob(os.path.join(directory, "*.py")):
-        module_name = os.path.splitext(os.path.basename(filepath))[0]
-        if module_name == "__init__":
-            continue
+def load_algorithm(name: str) -> type[Algorithm]:
+    try:
+        module_name, class_name = ALGORITHMS[name].split(":")
+    except KeyError:
+        raise KeyError(f"{name} is not a registered algorithm, expected one of {sorted(ALGORITHMS)}")
 
-        module = importlib.import_module(module_name)
+    algorithm = getattr(importlib.import_module(module_name), class_name)
 
-        algorithm = [
-            algo_cls
-            for _, algo_cls in inspect.getmembers(module, inspect.isclass)
-            if (algo_cls.__module__ == module_name) and issubclass(algo_cls, Algorithm)
-        ]
+    if not issubclass(algorithm, Algorithm) or algorithm.name != name:
+        raise RuntimeError(f"{ALGORITHMS[name]} is not an Algorithm named {name}")
 
-        if len(algorithm) != 1:
-            raise RuntimeError("Expected exactly one Algorithm to be defined in each file")
+    return algorithm
 
-        algorithms.add(algorithm[0])  # type: ignore
 
-    # Remove directory from sys.path to avoid side effects
-    sys.path.pop(0)
-
-    return algorithms
-
-
-algorithms = import_all_from_directory("src/ifonly/lineups/algorithms")
+def load_algorithms(algorithm_parameters: dict) -> set[type[Algorithm]]:
+    return {load_algorithm(name) for name, parameters in algorithm_parameters.items() if parameters["run"]}
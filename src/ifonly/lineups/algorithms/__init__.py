@@ -1,37 +1,90 @@
 from ifonly import Contest
-from pyomo.core.base.PyomoModel import ConcreteModel
+from ifonly.lineups.batch import LineupBatch
+from ifonly.lineups.validate import LineupLookups, validate_lineups
+from ifonly.lineups.heuristics import greedy_lineup
 import pandas as pd
-from typing import Any
+import numpy as np
+from typing import Any, ClassVar, List, TYPE_CHECKING
+import logging
+
+if TYPE_CHECKING:
+    from pyomo.core.base.PyomoModel import ConcreteModel
+
+logger = logging.getLogger(__name__)
 
 
 class Algorithm:
-    def __init__(self, name: str):
-        self.name = name
-        """
-        Cache is meant to be used to reduce duplicate computations on similar competitions
+    """
+    Cache is meant to be used to reduce duplicate computations on similar competitions
 
-        Cache might check to see if a draft_group_id has already been solved for and then pull the relevant results
-        instead of calculating them again. Here's a non-exhaustive list of properties to check for cache matches
-            1. draft_group_id
-            2. max_entries
-            3. payouts
-        """
+    Cache might check to see if a draft_group_id has already been solved for and then pull the relevant results
+    instead of calculating them again. Here's a non-exhaustive list of properties to check for cache matches
+        1. draft_group_id
+        2. max_entries
+        3. payouts
+
+    Algorithms are only used as classes, each one is named by the `name` it's enabled by in ifonly.toml
+    """
+
+    name: ClassVar[str]
 
     @classmethod
     def get_empty_cache(cls) -> Any:
         raise NotImplementedError()
 
     @classmethod
-    def get_drafted_indices(cls, model: ConcreteModel) -> pd.Series:
-        return pd.Series([key for key, value in model.drafted.get_values().items() if value > 0.5])  # type: ignore
+    def get_drafted_indices(cls, model: "ConcreteModel") -> pd.Series:
+        values = model.drafted.get_values()  # type: ignore
+        drafted = [key for key, value in values.items() if value is not None and value > 0.5]
+
+        # models built over a pruned set of draftables map their variables back to positions in `contest.draftables`
+        draftable_positions = getattr(model, "draftable_positions", None)
+        if draftable_positions is not None:
+            drafted = draftable_positions[drafted].tolist()
+
+        return pd.Series(drafted, dtype="int64")
+
+    @classmethod
+    def is_valid_solution(cls, contest: Contest, drafted_indices: pd.Series) -> bool:
+        valid, _ = validate_lineups(drafted_indices.to_numpy()[None, :], LineupLookups.from_contest(contest))
+        return bool(valid[0])
+
+    @classmethod
+    def get_fallback_indices(cls, contest: Contest, excluded: List[pd.Series] | None = None) -> pd.Series:
+        """
+        Finds a valid lineup with a greedy heuristic for when the solver runs out of time without a valid lineup,
+        skipping lineups that draft the same players as any of `excluded`
+        """
+        logger.warning(f"Using a heuristic lineup for {cls.name} in draft group {contest.details.draft_group_id}")
+
+        excluded_lineups = np.array([indices.to_numpy() for indices in excluded]) if excluded else None
+        lineup = greedy_lineup(LineupLookups.from_contest(contest), contest.draftable_projections, excluded_lineups)
+
+        if lineup is None:
+            raise Exception(f"Could not find a valid lineup for draft group {contest.details.draft_group_id}")
+
+        return pd.Series(np.sort(lineup))
+
+    @classmethod
+    def prepare(cls, contests: List[Contest], cache: Any, **kwargs) -> None:
+        """
+        Called with all of a day's contests before `generate_lineups` is called for each of them, so algorithms can
+        fill their cache for many contests at once (e.g. by solving draft groups concurrently)
+        """
+        pass
+
+    @classmethod
+    def build_problem(cls, contest: Contest, **kwargs) -> "ConcreteModel":
+        """Builds the model an algorithm solves first for `contest`, for algorithms that solve MILPs"""
+        raise NotImplementedError(f"{cls.name} doesn't solve MILPs")
 
     @classmethod
-    def generate_lineups(cls, contest: Contest, cache: Any, **kwargs) -> pd.DataFrame:
+    def generate_lineups(cls, contest: Contest, cache: Any, **kwargs) -> pd.DataFrame | LineupBatch:
         raise NotImplementedError()
 
 
 class CachedAlgorithm:
-    def __init__(self, algorithm: Algorithm):
+    def __init__(self, algorithm: type[Algorithm]):
         self.algorithm = algorithm
         self.initialize_cache()
 
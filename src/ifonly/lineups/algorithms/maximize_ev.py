@@ -2,16 +2,30 @@ import pandas as pd
 import numpy as np
 from ifonly import Contest
 from ifonly.lineups.algorithms import Algorithm
+from ifonly.lineups.pruning import get_undominated_positions
+from ifonly.lineups.solvers import (
+    SolverDispatcher,
+    SolverResult,
+    clear_drafted,
+    get_pyomo_gap,
+    get_pyomo_nodes,
+    get_solver_options,
+    has_pyomo_solution,
+    scales_salaries,
+    supports_dispatch,
+)
+from ifonly.lineups.telemetry import record_solve
 import pyomo.environ as pyo
 from pyomo.core.expr.numeric_expr import LinearExpression
 from pyomo.core.base.PyomoModel import ConcreteModel
 from pyomo.opt.base.solvers import OptSolver
-from typing import Tuple, Dict
+from typing import Tuple, Dict, List
+import time
 
 
 class MaximizeEVAlgorithm(Algorithm):
     cache_type = Dict[int, pd.DataFrame]
-    name = __name__
+    name = "maximize_ev"
 
     @classmethod
     def get_empty_cache(cls) -> "MaximizeEVAlgorithm.cache_type":
@@ -19,20 +33,28 @@ class MaximizeEVAlgorithm(Algorithm):
 
     @classmethod
     def initialize_problem(cls, contest: Contest, salary: int, solver: dict) -> Tuple[ConcreteModel, OptSolver]:
+        started_at = time.perf_counter()
+
+        # Only model the draftables that could appear in the best lineup
+        keep = 1
+        draftable_positions = get_undominated_positions(contest, keep=keep)
+        draftables = contest.draftables.iloc[draftable_positions]
+
         num_to_draft = contest.lineup_reqs.sum()
-        num_draftables = len(contest.draftables)
-        num_players = contest.draftables.player_id.nunique()
+        num_draftables = len(draftables)
+        num_players = draftables.player_id.nunique()
         num_positions = len(contest.lineup_reqs)
-        num_competitions = contest.draft_group.games_count
-        projections = contest.projections.values
-        salaries = contest.draftables.salary.astype("int64")
-        # NOTE: I think dividing by gcd will make things run faster, but haven't tested this
-        salary_gcd = np.gcd.reduce(salaries)
+        projections = contest.draftable_projections[draftable_positions]
+        salaries = draftables.salary.astype("int64")
+        # dividing by the gcd may make the problem easier, `python -m ifonly tune` measures whether it does
+        salary_gcd = np.gcd.reduce(salaries) if scales_salaries(solver, contest.contest_type_id) else 1
 
         model = pyo.ConcreteModel(name=__name__)
 
         # Pyomo Variables
         model.drafted = pyo.Var(range(num_draftables), domain=pyo.Boolean)
+        model.draftable_positions = draftable_positions
+        model.keep = keep
         drafted_vars_list = [model.drafted[i] for i in range(num_draftables)]
 
         # Pyomo Objectives
@@ -47,7 +69,7 @@ class MaximizeEVAlgorithm(Algorithm):
         model.constraints.add(drafted_salaries <= salary // salary_gcd)
 
         # Player Constraint
-        player_ids = contest.draftables.player_id.astype("category")
+        player_ids = draftables.player_id.astype("category")
         player_matrix = np.zeros((num_draftables, num_players), dtype="int8")
         player_matrix[np.arange(num_draftables), player_ids.cat.codes] = 1
         for col in range(num_players):
@@ -57,7 +79,7 @@ class MaximizeEVAlgorithm(Algorithm):
             )
 
         # Positional Constraint
-        roster_slots = contest.draftables.roster_slot_id.astype("category")
+        roster_slots = draftables.roster_slot_id.astype("category")
         position_matrix = np.zeros((num_draftables, num_positions), dtype="int8")
         position_matrix[np.arange(num_draftables), roster_slots.cat.codes] = 1
         for roster_slot_id in contest.lineup_reqs.index:
@@ -66,7 +88,8 @@ class MaximizeEVAlgorithm(Algorithm):
             model.constraints.add(drafted_positions == contest.lineup_reqs.loc[roster_slot_id])
 
         # Game Constraint
-        competition_ids = contest.draftables.competition_id.astype("category")
+        competition_ids = draftables.competition_id.astype("category")
+        num_competitions = len(competition_ids.cat.categories)
         competition_matrix = np.zeros((num_draftables, num_competitions), dtype="int8")
         competition_matrix[np.arange(num_draftables), competition_ids.cat.codes] = 1
         for col in range(num_competitions):
@@ -74,12 +97,14 @@ class MaximizeEVAlgorithm(Algorithm):
                 linear_coefs=competition_matrix[:, col], linear_vars=drafted_vars_list
             )
             must_choose_from_multiple_games = int(
-                (contest.draft_group.contest_type_id not in {81, 93}) and (num_competitions > 1)
+                (contest.draft_group.contest_type_id not in {81, 93}) and (contest.draft_group.games_count > 1)
             )
             model.constraints.add(drafted_competitions <= num_to_draft - must_choose_from_multiple_games)
 
         # Initialize Pyomo Solver
         opt = pyo.SolverFactory(solver["name"], executable=solver["executable"])
+        model.solver_options = get_solver_options(solver, contest.contest_type_id)
+        opt.options.update(model.solver_options)
 
         # TODO: use this when we solve for multiple lineups
         # if USE_PERSISTENT_SOLVER:
@@ -88,17 +113,11 @@ class MaximizeEVAlgorithm(Algorithm):
         # else:
         #     opt = pyo.SolverFactory("cbc", executable="solvers/cbc.exe")
 
+        model.build_time = time.perf_counter() - started_at
         return model, opt
 
     @classmethod
-    def generate_lineups(
-        cls,
-        contest: Contest,
-        cache: "MaximizeEVAlgorithm.cache_type",
-        **kwargs,
-    ) -> pd.DataFrame:
-        """Single Lineup Solver"""
-
+    def get_parameters(cls, **kwargs) -> Tuple[bool, int, dict]:
         try:
             USE_PERSISTENT_SOLVER = kwargs["solver"]["persistent"]
         except:
@@ -114,25 +133,89 @@ class MaximizeEVAlgorithm(Algorithm):
         except:
             raise TypeError("solver must be specified in configuration file")
 
+        return USE_PERSISTENT_SOLVER, SALARY, SOLVER
+
+    @classmethod
+    def build_problem(cls, contest: Contest, **kwargs) -> ConcreteModel:
+        _, SALARY, SOLVER = cls.get_parameters(**kwargs)
+        return cls.initialize_problem(contest, SALARY, SOLVER)[0]
+
+    @classmethod
+    def get_lineup(cls, contest: Contest, drafted_indices: pd.Series, mip_gap: float, fallback: bool) -> pd.DataFrame:
+        return (
+            contest.draftables.iloc[drafted_indices]
+            .assign(lineup_num=0, mip_gap=mip_gap, fallback=fallback)
+            .set_index("lineup_num", append=True)
+            .swaplevel()
+        )
+
+    @classmethod
+    def prepare(cls, contests: List[Contest], cache: "MaximizeEVAlgorithm.cache_type", **kwargs) -> None:
+        """Solves every draft group that isn't cached yet concurrently"""
+        _, SALARY, SOLVER = cls.get_parameters(**kwargs)
+
+        if not supports_dispatch(SOLVER):
+            return
+
+        unsolved: Dict[int, Contest] = {}
+        for contest in contests:
+            if contest.details.draft_group_id not in cache:
+                unsolved.setdefault(contest.details.draft_group_id, contest)
+
+        def on_solution(draft_group_id: int, model: ConcreteModel, result: SolverResult) -> bool:
+            contest = unsolved[draft_group_id]
+            record_solve(cls.name, contest, model, result.status, result.wall_time, result.gap, result.nodes)
+            drafted_indices = cls.get_drafted_indices(model)
+
+            if result.has_solution and cls.is_valid_solution(contest, drafted_indices):
+                cache[draft_group_id] = cls.get_lineup(contest, drafted_indices, result.gap, fallback=False)
+            else:
+                cache[draft_group_id] = cls.get_lineup(
+                    contest, cls.get_fallback_indices(contest), np.nan, fallback=True
+                )
+
+            return False
+
+        problems = (
+            (draft_group_id, cls.initialize_problem(contest, SALARY, SOLVER)[0])
+            for draft_group_id, contest in unsolved.items()
+        )
+        SolverDispatcher(SOLVER).solve(problems, on_solution)
+
+    @classmethod
+    def generate_lineups(
+        cls,
+        contest: Contest,
+        cache: "MaximizeEVAlgorithm.cache_type",
+        **kwargs,
+    ) -> pd.DataFrame:
+        """Single Lineup Solver"""
+
+        USE_PERSISTENT_SOLVER, SALARY, SOLVER = cls.get_parameters(**kwargs)
+
         if contest.details.draft_group_id in cache:
             return cache[contest.details.draft_group_id]
 
         model, opt = cls.initialize_problem(contest, SALARY, SOLVER)
 
+        clear_drafted(model)
+        started_at = time.perf_counter()
         sol = opt.solve() if USE_PERSISTENT_SOLVER else opt.solve(model)
-
-        if (cond := sol.solver.termination_condition) != "optimal":
-            breakpoint()
-            raise Exception(f"Solver terminated with condition {cond}")
-
+        record_solve(
+            cls.name,
+            contest,
+            model,
+            str(sol.solver.termination_condition),
+            time.perf_counter() - started_at,
+            get_pyomo_gap(sol),
+            get_pyomo_nodes(sol),
+        )
         drafted_indices = cls.get_drafted_indices(model)
 
-        lineup = (
-            contest.draftables.iloc[drafted_indices]
-            .assign(lineup_num=0)
-            .set_index("lineup_num", append=True)
-            .swaplevel()
-        )
+        if has_pyomo_solution(sol, model) and cls.is_valid_solution(contest, drafted_indices):
+            lineup = cls.get_lineup(contest, drafted_indices, get_pyomo_gap(sol), fallback=False)
+        else:
+            lineup = cls.get_lineup(contest, cls.get_fallback_indices(contest), np.nan, fallback=True)
 
         cache[contest.details.draft_group_id] = lineup
 
@@ -2,21 +2,45 @@ import pandas as pd
 import numpy as np
 from ifonly import Contest
 from ifonly.lineups.algorithms import Algorithm
+from ifonly.lineups.pruning import get_undominated_positions
+from ifonly.lineups.solvers import (
+    SolverDispatcher,
+    SolverResult,
+    clear_drafted,
+    get_pyomo_gap,
+    get_pyomo_nodes,
+    get_solver_options,
+    has_pyomo_solution,
+    scales_salaries,
+    supports_dispatch,
+)
+from ifonly.lineups.telemetry import record_solve
 import pyomo.environ as pyo
 from pyomo.core.expr.numeric_expr import LinearExpression
 from pyomo.core.base.PyomoModel import ConcreteModel
 from pyomo.opt.base.solvers import OptSolver
-from collections import defaultdict
-from typing import Tuple, List
+from dataclasses import dataclass, field
+from typing import Iterator, Tuple, List, Dict
+import math
+import time
+
+
+@dataclass
+class SamplerPool:
+    """The lineups solved for a draft group so far, and the model (with a cut for each lineup) to solve more with"""
+
+    model: ConcreteModel
+    opt: OptSolver
+    lineups: List[pd.DataFrame] = field(default_factory=list)
 
 
 class MaximizeEVSamplerAlgorithm(Algorithm):
-    cache_type = defaultdict[int, List[pd.DataFrame]]
-    name = __name__
+    cache_type = Dict[int, SamplerPool]
+    name = "maximize_ev_sampler"
 
     @classmethod
     def get_empty_cache(cls) -> "MaximizeEVSamplerAlgorithm.cache_type":
-        return defaultdict(list)
+        return {}
 
     @classmethod
     def initialize_problem(
@@ -24,29 +48,32 @@ class MaximizeEVSamplerAlgorithm(Algorithm):
         contest: Contest,
         salary: int,
         projection_cutoff: float,
+        sample_size: int,
         solver: dict,
     ) -> Tuple[ConcreteModel, OptSolver]:
+        started_at = time.perf_counter()
+
+        # Only model the draftables that are projected above the cutoff and could appear in one of the sampled lineups
+        draftable_positions = get_undominated_positions(contest, keep=sample_size, min_projection=projection_cutoff)
+        draftables = contest.draftables.iloc[draftable_positions]
+
         num_to_draft = contest.lineup_reqs.sum()
-        num_draftables = len(contest.draftables)
-        num_players = contest.draftables.player_id.nunique()
+        num_draftables = len(draftables)
+        num_players = draftables.player_id.nunique()
         num_positions = len(contest.lineup_reqs)
-        num_competitions = contest.draft_group.games_count
-        projections = contest.projections.values
-        salaries = contest.draftables.salary.astype("int64")
-        # NOTE: I think dividing by gcd will make things run faster, but haven't tested this
-        salary_gcd = np.gcd.reduce(salaries)
+        projections = contest.draftable_projections[draftable_positions]
+        salaries = draftables.salary.astype("int64")
+        # dividing by the gcd may make the problem easier, `python -m ifonly tune` measures whether it does
+        salary_gcd = np.gcd.reduce(salaries) if scales_salaries(solver, contest.contest_type_id) else 1
 
         model = pyo.ConcreteModel(name=__name__)
 
         # Pyomo Variables
         model.drafted = pyo.Var(range(num_draftables), domain=pyo.Boolean)
+        model.draftable_positions = draftable_positions
+        model.keep = sample_size
         drafted_vars_list = [model.drafted[i] for i in range(num_draftables)]
 
-        # Set Variables to 0 if projected value is < a certain threshold
-        for idx, projection in enumerate(projections):
-            if projection < projection_cutoff:
-                model.drafted[idx].fix(0)  # type: ignore
-
         # Pyomo Objectives
         drafted_ev = LinearExpression(linear_coefs=projections, linear_vars=drafted_vars_list)
         model.obj = pyo.Objective(expr=drafted_ev, sense=pyo.maximize)
@@ -59,7 +86,7 @@ class MaximizeEVSamplerAlgorithm(Algorithm):
         model.constraints.add(drafted_salaries <= salary // salary_gcd)
 
         # Player Constraint
-        player_ids = contest.draftables.player_id.astype("category")
+        player_ids = draftables.player_id.astype("category")
         player_matrix = np.zeros((num_draftables, num_players), dtype="int8")
         player_matrix[np.arange(num_draftables), player_ids.cat.codes] = 1
         for col in range(num_players):
@@ -69,7 +96,7 @@ class MaximizeEVSamplerAlgorithm(Algorithm):
             )
 
         # Positional Constraint
-        roster_slots = contest.draftables.roster_slot_id.astype("category")
+        roster_slots = draftables.roster_slot_id.astype("category")
         position_matrix = np.zeros((num_draftables, num_positions), dtype="int8")
         position_matrix[np.arange(num_draftables), roster_slots.cat.codes] = 1
         for roster_slot_id in contest.lineup_reqs.index:
@@ -78,7 +105,8 @@ class MaximizeEVSamplerAlgorithm(Algorithm):
             model.constraints.add(drafted_positions == contest.lineup_reqs.loc[roster_slot_id])
 
         # Game Constraint
-        competition_ids = contest.draftables.competition_id.astype("category")
+        competition_ids = draftables.competition_id.astype("category")
+        num_competitions = len(competition_ids.cat.categories)
         competition_matrix = np.zeros((num_draftables, num_competitions), dtype="int8")
         competition_matrix[np.arange(num_draftables), competition_ids.cat.codes] = 1
         for col in range(num_competitions):
@@ -86,12 +114,14 @@ class MaximizeEVSamplerAlgorithm(Algorithm):
                 linear_coefs=competition_matrix[:, col], linear_vars=drafted_vars_list
             )
             must_choose_from_multiple_games = int(
-                (contest.draft_group.contest_type_id not in {81, 93}) and (num_competitions > 1)
+                (contest.draft_group.contest_type_id not in {81, 93}) and (contest.draft_group.games_count > 1)
             )
             model.constraints.add(drafted_competitions <= num_to_draft - must_choose_from_multiple_games)
 
         # Initialize Pyomo Solver
         opt = pyo.SolverFactory(solver["name"], executable=solver["executable"])
+        model.solver_options = get_solver_options(solver, contest.contest_type_id)
+        opt.options.update(model.solver_options)
 
         # TODO: use this when we solve for multiple lineups
         # if USE_PERSISTENT_SOLVER:
@@ -100,17 +130,11 @@ class MaximizeEVSamplerAlgorithm(Algorithm):
         # else:
         #     opt = pyo.SolverFactory("cbc", executable="solvers/cbc.exe")
 
+        model.build_time = time.perf_counter() - started_at
         return model, opt
 
     @classmethod
-    def generate_lineups(
-        cls,
-        contest: Contest,
-        cache: "MaximizeEVSamplerAlgorithm.cache_type",
-        **kwargs,
-    ) -> pd.DataFrame:
-        """Single Lineup Solver"""
-
+    def get_parameters(cls, **kwargs) -> Tuple[bool, int, float, int, int, dict]:
         try:
             USE_PERSISTENT_SOLVER = kwargs["solver"]["persistent"]
         except:
@@ -139,51 +163,195 @@ class MaximizeEVSamplerAlgorithm(Algorithm):
         if SAMPLE_SIZE < DESIRED_LINEUPS:
             raise Exception("The Sample Size must be greater than the desired number of lineups")
 
+        if not 0 <= kwargs.get("min_pool_share", 1) <= 1:
+            raise Exception("The minimum pool share must be between 0 and 1")
+
         try:
             SOLVER = kwargs["solver"]
         except:
             raise TypeError("solver must be specified in configuration file")
 
+        return USE_PERSISTENT_SOLVER, SALARY, PROJECTION_CUTOFF, SAMPLE_SIZE, DESIRED_LINEUPS, SOLVER
+
+    @classmethod
+    def build_problem(cls, contest: Contest, **kwargs) -> ConcreteModel:
+        """Builds the model pruned for a pool of `keep` lineups if it's given (e.g. as recorded), else `sample_size`"""
+        _, SALARY, PROJECTION_CUTOFF, SAMPLE_SIZE, DESIRED_LINEUPS, SOLVER = cls.get_parameters(**kwargs)
+        keep = kwargs.get("keep", SAMPLE_SIZE)
+        return cls.initialize_problem(contest, SALARY, PROJECTION_CUTOFF, keep, SOLVER)[0]
+
+    @classmethod
+    def get_lineup(
+        cls, contest: Contest, drafted_indices: pd.Series, lineup_num: int, mip_gap: float, fallback: bool
+    ) -> pd.DataFrame:
+        return (
+            contest.draftables.iloc[drafted_indices]
+            .assign(
+                lineup_num=lineup_num,
+                projected=lambda df: contest.projections.loc[df.index],
+                mip_gap=mip_gap,
+                fallback=fallback,
+            )
+            .set_index("lineup_num", append=True)
+            .swaplevel()
+        )
+
+    @classmethod
+    def get_next_lineup(
+        cls, contest: Contest, model: ConcreteModel, has_solution: bool, mip_gap: float, sampled: List[pd.DataFrame]
+    ) -> Tuple[pd.Series, pd.DataFrame]:
+        """Reads the next lineup out of a solved model, or finds one heuristically if the solver didn't find one"""
+        drafted_indices = cls.get_drafted_indices(model)
+
+        if has_solution and cls.is_valid_solution(contest, drafted_indices):
+            return drafted_indices, cls.get_lineup(contest, drafted_indices, len(sampled), mip_gap, fallback=False)
+
+        sampled_indices = [
+            pd.Series(contest.draftables.index.get_indexer(lineup.index.get_level_values("draftable_id")))
+            for lineup in sampled
+        ]
+        drafted_indices = cls.get_fallback_indices(contest, excluded=sampled_indices)
+        return drafted_indices, cls.get_lineup(contest, drafted_indices, len(sampled), np.nan, fallback=True)
+
+    @classmethod
+    def get_duplicate_constraint(cls, contest: Contest, model: ConcreteModel, drafted_indices: pd.Series):
+        """Prevent this exact lineup from being drafted again"""
+        drafted_player_ids = contest.draftables.iloc[drafted_indices].player_id
+        modelled_player_ids = contest.draftables.player_id.iloc[model.draftable_positions]  # type: ignore
+
+        return LinearExpression(
+            linear_coefs=modelled_player_ids.isin(drafted_player_ids).astype(int).tolist(),
+            linear_vars=[model.drafted[i] for i in range(len(modelled_player_ids))],  # type: ignore
+        ) <= (len(drafted_indices) - 1)
+
+    @classmethod
+    def get_pool_size(cls, demand: int, sample_size: int, desired_lineups: int, min_pool_share: float) -> int:
+        """
+        Returns the number of lineups to sample `demand` lineups from, keeping the ratio of `sample_size` lineups for
+        every `desired_lineups` lineups submitted but never sampling from fewer than `min_pool_share` of `sample_size`
+
+        `min_pool_share` is 1 unless it's configured, so by default every contest samples from the top `sample_size`
+        lineups. A lower share lets contests that submit fewer lineups solve smaller pools, e.g. with 0 a contest that
+        submits one lineup only solves `sample_size / desired_lineups` of them
+        """
+        min_pool_size = math.ceil(min_pool_share * sample_size)
+        return max(demand, min_pool_size, math.ceil(sample_size * demand / desired_lineups))
+
+    @classmethod
+    def get_pool(
+        cls,
+        contest: Contest,
+        cache: "MaximizeEVSamplerAlgorithm.cache_type",
+        salary: int,
+        projection_cutoff: float,
+        sample_size: int,
+        desired_lineups: int,
+        solver: dict,
+    ) -> SamplerPool:
         if contest.details.draft_group_id not in cache:
-            model, opt = cls.initialize_problem(contest, SALARY, PROJECTION_CUTOFF, SOLVER)
+            # prune for the biggest pool any contest could need, so the model can keep being extended
+            model, opt = cls.initialize_problem(contest, salary, projection_cutoff, sample_size, solver)
+            cache[contest.details.draft_group_id] = SamplerPool(model, opt)
 
-            for lineup_num in range(SAMPLE_SIZE):
-                sol = opt.solve() if USE_PERSISTENT_SOLVER else opt.solve(model)
+        return cache[contest.details.draft_group_id]
 
-                if (cond := sol.solver.termination_condition) != "optimal":
-                    breakpoint()
-                    raise Exception(f"Solver terminated with condition {cond}")
+    @classmethod
+    def prepare(cls, contests: List[Contest], cache: "MaximizeEVSamplerAlgorithm.cache_type", **kwargs) -> None:
+        """
+        Solves the pool of every draft group out to the largest pool its contests need, with draft groups solved
+        concurrently. Draft groups that were already solved far enough aren't solved again
+        """
+        _, SALARY, PROJECTION_CUTOFF, SAMPLE_SIZE, DESIRED_LINEUPS, SOLVER = cls.get_parameters(**kwargs)
+
+        if not supports_dispatch(SOLVER):
+            return
+
+        pool_sizes: Dict[int, int] = {}
+        pool_contests: Dict[int, Contest] = {}
+        for contest in contests:
+            draft_group_id = contest.details.draft_group_id
+            pool_size = cls.get_pool_size(
+                min(DESIRED_LINEUPS, contest.max_entries),
+                SAMPLE_SIZE,
+                DESIRED_LINEUPS,
+                kwargs.get("min_pool_share", 1),
+            )
+            pool_sizes[draft_group_id] = max(pool_sizes.get(draft_group_id, 0), pool_size)
+            pool_contests.setdefault(draft_group_id, contest)
 
-                drafted_indices = cls.get_drafted_indices(model)
+        def on_solution(draft_group_id: int, model: ConcreteModel, result: SolverResult) -> bool:
+            contest, pool = pool_contests[draft_group_id], cache[draft_group_id]
+            record_solve(cls.name, contest, model, result.status, result.wall_time, result.gap, result.nodes)
+            drafted_indices, lineup = cls.get_next_lineup(contest, model, result.has_solution, result.gap, pool.lineups)
+            pool.lineups.append(lineup)
+            model.constraints.add(cls.get_duplicate_constraint(contest, model, drafted_indices))  # type: ignore
 
-                lineup = (
-                    contest.draftables.iloc[drafted_indices]
-                    .assign(lineup_num=lineup_num, projected=lambda df: contest.projections.loc[df.index])
-                    .set_index("lineup_num", append=True)
-                    .swaplevel()
-                )
+            return len(pool.lineups) < pool_sizes[draft_group_id]
 
-                cache[contest.details.draft_group_id].append(lineup)
+        # models are built as the dispatcher asks for them, so building overlaps with solving
+        def get_problems() -> Iterator[Tuple[int, ConcreteModel]]:
+            for draft_group_id, contest in pool_contests.items():
+                pool = cls.get_pool(contest, cache, SALARY, PROJECTION_CUTOFF, SAMPLE_SIZE, DESIRED_LINEUPS, SOLVER)
+                if len(pool.lineups) < pool_sizes[draft_group_id]:
+                    yield draft_group_id, pool.model
 
-                # Prevent this exact lineup from being drafted again
-                drafted_player_ids = contest.draftables.iloc[drafted_indices].player_id
+        SolverDispatcher(SOLVER).solve(get_problems(), on_solution)
 
-                lineup_overlap_constraint = LinearExpression(
-                    linear_coefs=contest.draftables.player_id.isin(drafted_player_ids).astype(int).tolist(),
-                    linear_vars=[model.drafted[i] for i in range(len(contest.draftables))],  # type: ignore
-                ) <= (len(drafted_indices) - 1)
+    @classmethod
+    def generate_lineups(
+        cls,
+        contest: Contest,
+        cache: "MaximizeEVSamplerAlgorithm.cache_type",
+        **kwargs,
+    ) -> pd.DataFrame:
+        """Single Lineup Solver"""
 
-                if USE_PERSISTENT_SOLVER:
-                    constraint = pyo.Constraint(expr=lineup_overlap_constraint)
-                    constraint_name = f"duplicate_constraint_{lineup_num}"
-                    setattr(model, constraint_name, constraint)
-                    opt.add_constraint(getattr(model, constraint_name))  # type: ignore
-                else:
-                    model.constraints.add(lineup_overlap_constraint)  # type: ignore
+        USE_PERSISTENT_SOLVER, SALARY, PROJECTION_CUTOFF, SAMPLE_SIZE, DESIRED_LINEUPS, SOLVER = cls.get_parameters(
+            **kwargs
+        )
 
+        # only solve as many lineups as this contest needs, on top of the ones solved for earlier contests
         lineups_to_submit = min(DESIRED_LINEUPS, contest.max_entries)
-        selected_lineup_indices = np.random.choice(SAMPLE_SIZE, lineups_to_submit, replace=False)
-        selected_lineups = pd.concat([cache[contest.details.draft_group_id][idx] for idx in selected_lineup_indices])
+        pool_size = cls.get_pool_size(lineups_to_submit, SAMPLE_SIZE, DESIRED_LINEUPS, kwargs.get("min_pool_share", 1))
+        pool = cls.get_pool(contest, cache, SALARY, PROJECTION_CUTOFF, SAMPLE_SIZE, DESIRED_LINEUPS, SOLVER)
+        model, opt = pool.model, pool.opt
+
+        while len(pool.lineups) < pool_size:
+            clear_drafted(model)
+            started_at = time.perf_counter()
+            sol = opt.solve() if USE_PERSISTENT_SOLVER else opt.solve(model)
+            record_solve(
+                cls.name,
+                contest,
+                model,
+                str(sol.solver.termination_condition),
+                time.perf_counter() - started_at,
+                get_pyomo_gap(sol),
+                get_pyomo_nodes(sol),
+            )
+
+            drafted_indices, lineup = cls.get_next_lineup(
+                contest,
+                model,
+                has_pyomo_solution(sol, model),
+                get_pyomo_gap(sol),
+                pool.lineups,
+            )
+            pool.lineups.append(lineup)
+
+            lineup_overlap_constraint = cls.get_duplicate_constraint(contest, model, drafted_indices)
+
+            if USE_PERSISTENT_SOLVER:
+                constraint = pyo.Constraint(expr=lineup_overlap_constraint)
+                constraint_name = f"duplicate_constraint_{len(pool.lineups) - 1}"
+                setattr(model, constraint_name, constraint)
+                opt.add_constraint(getattr(model, constraint_name))  # type: ignore
+            else:
+                model.constraints.add(lineup_overlap_constraint)  # type: ignore
+
+        # sample from the lineups a contest of this size would have been given, however far the pool has grown
+        selected_lineup_indices = np.random.choice(pool_size, lineups_to_submit, replace=False)
+        selected_lineups = pd.concat([pool.lineups[idx] for idx in selected_lineup_indices])
         return selected_lineups
 
         # TODO: add covariance in another algorithm
@@ -1,32 +1,34 @@
 from ifonly import Contest
-from ifonly.lineups.validate import is_valid_lineup
+from ifonly.lineups.validate import LineupLookups
+from ifonly.lineups.sampling import sample_lineups
+from ifonly.lineups.batch import LineupBatch
 from ifonly.lineups.algorithms import Algorithm
-import pandas as pd
-from typing import Optional
+import numpy as np
+from typing import Dict
 
 
 class RandomAlgorithm(Algorithm):
-    cache_type = Optional[None]
-    name = __name__
+    cache_type = Dict[int, LineupLookups]
+    name = "random_sampler"
 
     @classmethod
     def get_empty_cache(cls) -> "RandomAlgorithm.cache_type":
-        return None
+        return dict()
 
     @classmethod
-    def generate_lineups(cls, contest: Contest, cache: "RandomAlgorithm.cache_type", **kwargs) -> pd.DataFrame:
-        # take a super naive approach at first just to get the ball rolling
-        while True:
-            lineup_by_roster_slot = []
-            for roster_slot_id, count in contest.lineup_reqs.items():
-                roster_slot_mask = contest.draftables.roster_slot_id.eq(roster_slot_id)  # type: ignore
-                draftables = contest.draftables.loc[roster_slot_mask]
-                drafted = draftables.sample(count)
-                lineup_by_roster_slot.append(drafted)
-
-            lineup = (
-                pd.concat(lineup_by_roster_slot).assign(lineup_num=0).set_index("lineup_num", append=True).swaplevel()
-            )
-
-            if is_valid_lineup(lineup, contest):
-                return lineup
+    def generate_lineups(cls, contest: Contest, cache: "RandomAlgorithm.cache_type", **kwargs) -> LineupBatch:
+        DESIRED_LINEUPS = kwargs.get("desired_lineups", 1)
+        BATCH_SIZE = kwargs.get("batch_size", 1024)
+        MAX_BATCHES = kwargs.get("max_batches", 100)
+
+        if contest.details.draft_group_id not in cache:
+            cache[contest.details.draft_group_id] = LineupLookups.from_contest(contest)
+
+        lookups = cache[contest.details.draft_group_id]
+        lineups_to_submit = min(DESIRED_LINEUPS, contest.max_entries)
+        lineups = sample_lineups(lookups, lineups_to_submit, np.random.default_rng(), BATCH_SIZE, MAX_BATCHES)
+
+        if len(lineups) == 0:
+            raise Exception(f"Could not sample a valid lineup for draft group {contest.details.draft_group_id}")
+
+        return LineupBatch.from_positions(lineups, cls.name)
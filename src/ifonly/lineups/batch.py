@@ -0,0 +1,126 @@
+import pandas as pd
+import numpy as np
+from typing import Iterable, Optional, Tuple
+
+PADDING = -1
+
+
+class LineupBatch:
+    """
+    A compact representation of many lineups drafted from the same draft group
+
+    Each lineup is a row of `positions`, which holds the position of each drafted player in `contest.draftables`.
+    Lineups with fewer players than the widest lineup in the batch are padded with `PADDING`. Lineups from a solver are
+    tagged with the relative MIP gap it achieved (NaN otherwise) and whether a heuristic fallback lineup was used
+    instead
+    """
+
+    __slots__ = ("positions", "algorithm_codes", "algorithms", "lineup_nums", "mip_gaps", "fallbacks")
+
+    def __init__(
+        self,
+        positions: np.ndarray,
+        algorithm_codes: np.ndarray,
+        algorithms: Tuple[str, ...],
+        lineup_nums: np.ndarray,
+        mip_gaps: Optional[np.ndarray] = None,
+        fallbacks: Optional[np.ndarray] = None,
+    ):
+        positions = np.asarray(positions, dtype="int32")
+        # empty batches are already 2d, since a (0, -1) shape can't be inferred
+        self.positions = positions if positions.ndim == 2 else positions.reshape(len(lineup_nums), -1)
+        self.algorithm_codes = np.asarray(algorithm_codes, dtype="int16")
+        self.algorithms = tuple(algorithms)
+        self.lineup_nums = np.asarray(lineup_nums, dtype="int32")
+        self.mip_gaps = np.full(len(lineup_nums), np.nan, dtype="float32") if mip_gaps is None else mip_gaps
+        self.fallbacks = np.zeros(len(lineup_nums), dtype="bool") if fallbacks is None else fallbacks
+
+    def __len__(self) -> int:
+        return len(self.lineup_nums)
+
+    def __repr__(self) -> str:
+        return f"LineupBatch(lineups={len(self)}, roster_size={self.positions.shape[1]}, algorithms={self.algorithms})"
+
+    @property
+    def index(self) -> pd.MultiIndex:
+        return pd.MultiIndex.from_arrays(
+            [np.take(np.array(self.algorithms, dtype=object), self.algorithm_codes), self.lineup_nums],
+            names=["algorithm", "lineup_num"],
+        )
+
+    @classmethod
+    def from_positions(cls, positions: np.ndarray, algorithm: str) -> "LineupBatch":
+        positions = np.atleast_2d(positions)
+        return cls(positions, np.zeros(len(positions)), (algorithm,), np.arange(len(positions)))
+
+    @classmethod
+    def from_frame(
+        cls, lineups: pd.DataFrame, draftables: pd.DataFrame, algorithm: Optional[str] = None
+    ) -> "LineupBatch":
+        """
+        Converts lineups indexed by ("algorithm", "lineup_num", "draftable_id") or, when `algorithm` is given, by
+        ("lineup_num", "draftable_id")
+        """
+        draftable_ids = lineups.index.get_level_values("draftable_id")
+        lineup_keys = lineups.index.droplevel("draftable_id")
+
+        if algorithm is None:
+            algorithm_codes, algorithms = pd.factorize(lineup_keys.get_level_values("algorithm").astype(str))
+        else:
+            algorithm_codes, algorithms = np.zeros(len(lineups), dtype="int16"), pd.Index([algorithm])
+
+        lineup_codes, _ = pd.factorize(
+            pd.MultiIndex.from_arrays([algorithm_codes, lineup_keys.get_level_values("lineup_num")])
+        )
+        slot_nums = pd.Series(lineup_codes).groupby(lineup_codes).cumcount().to_numpy()
+
+        num_lineups = lineup_codes.max() + 1 if len(lineup_codes) else 0
+        positions = np.full((num_lineups, slot_nums.max() + 1 if len(slot_nums) else 0), PADDING, dtype="int32")
+        positions[lineup_codes, slot_nums] = draftables.index.get_indexer(draftable_ids)
+
+        first_rows = np.unique(lineup_codes, return_index=True)[1]
+        return cls(
+            positions,
+            algorithm_codes[first_rows],
+            tuple(algorithms),
+            lineup_keys.get_level_values("lineup_num")[first_rows],
+            lineups["mip_gap"].to_numpy(dtype="float32")[first_rows] if "mip_gap" in lineups else None,
+            lineups["fallback"].to_numpy(dtype="bool")[first_rows] if "fallback" in lineups else None,
+        )
+
+    def to_frame(self, draftables: pd.DataFrame) -> pd.DataFrame:
+        """Converts back to draftable rows indexed by ("algorithm", "lineup_num", "draftable_id")"""
+        drafted = self.positions != PADDING
+        lineup_rows = np.nonzero(drafted)[0]
+
+        return (
+            draftables.iloc[self.positions[drafted]]
+            .set_index(self.index[lineup_rows], append=True)
+            .reorder_levels(["algorithm", "lineup_num", "draftable_id"])
+        )
+
+    @classmethod
+    def concat(cls, batches: Iterable["LineupBatch"]) -> "LineupBatch":
+        batches = list(batches)
+        if not batches:
+            return cls(np.empty((0, 0), dtype="int32"), np.empty(0, dtype="int16"), (), np.empty(0, dtype="int32"))
+
+        algorithms = tuple(dict.fromkeys(algorithm for batch in batches for algorithm in batch.algorithms))
+        roster_size = max(batch.positions.shape[1] for batch in batches)
+
+        positions = np.full((sum(map(len, batches)), roster_size), PADDING, dtype="int32")
+        start = 0
+        for batch in batches:
+            positions[start : start + len(batch), : batch.positions.shape[1]] = batch.positions
+            start += len(batch)
+
+        return cls(
+            positions,
+            np.concatenate(
+                [np.take([algorithms.index(a) for a in batch.algorithms], batch.algorithm_codes) for batch in batches]
+            ),
+            algorithms,
+            np.concatenate([batch.lineup_nums for batch in batches]),
+            np.concatenate([batch.mip_gaps for batch in batches]).astype("float32"),
+            np.concatenate([batch.fallbacks for batch in batches]).astype("bool"),
+        )
@@ -1,23 +1,43 @@
 from ifonly.lineups.algorithms import CachedAlgorithm
+from ifonly.lineups.batch import LineupBatch
 from ifonly import Contest
 import pandas as pd
+from typing import List
+
+
+def get_algorithm_parameters(cached_algorithm: CachedAlgorithm, parameters: dict) -> dict:
+    algorithm_specific_parameters = parameters["algorithms"][cached_algorithm.algorithm.name]
+
+    return {
+        **algorithm_specific_parameters,
+        "solver": parameters["solvers"].get(algorithm_specific_parameters.get("solver", None), None),
+    }
+
+
+def prepare_generation_algorithms(
+    contests: List[Contest],
+    cached_algorithms: set[CachedAlgorithm],
+    parameters: dict,
+) -> None:
+    for cached_algorithm in cached_algorithms:
+        algorithm_parameters = get_algorithm_parameters(cached_algorithm, parameters)
+        cached_algorithm.algorithm.prepare(contests, cached_algorithm.cache, **algorithm_parameters)
 
 
 def run_generation_algorithms(
     contest: Contest,
     cached_algorithms: set[CachedAlgorithm],
     parameters: dict,
-) -> pd.DataFrame:
+) -> LineupBatch:
     algorithm_lineups = []
     for cached_algorithm in cached_algorithms:
-        algorithm_specific_parameters = parameters["algorithms"][cached_algorithm.algorithm.name]
-
-        algorithm_parameters = {
-            **algorithm_specific_parameters,
-            "solver": parameters["solvers"].get(algorithm_specific_parameters.get("solver", None), None),
-        }
+        algorithm_name = cached_algorithm.algorithm.name
+        algorithm_parameters = get_algorithm_parameters(cached_algorithm, parameters)
 
         lineups = cached_algorithm.algorithm.generate_lineups(contest, cached_algorithm.cache, **algorithm_parameters)
+        if isinstance(lineups, pd.DataFrame):
+            lineups = LineupBatch.from_frame(lineups, contest.draftables, algorithm=algorithm_name)
+
         algorithm_lineups.append(lineups)
 
-    return pd.concat(algorithm_lineups, keys=cached_algorithms, names=["algorithm"])
+    return LineupBatch.concat(algorithm_lineups)
@@ -0,0 +1,66 @@
+from ifonly.lineups.validate import LineupLookups, validate_lineups
+from ifonly.lineups.sampling import get_roster_slot_pools, sample_lineups
+import numpy as np
+
+
+def get_player_keys(lineups: np.ndarray, lookups: LineupLookups) -> np.ndarray:
+    """Returns a key per lineup that's equal for lineups drafting the same players, regardless of their roster slots"""
+    players = np.ascontiguousarray(np.sort(lookups.players[lineups], axis=1))
+    return players.view(np.dtype((np.void, players.dtype.itemsize * players.shape[1]))).ravel()
+
+
+def greedy_lineup(
+    lookups: LineupLookups,
+    projections: np.ndarray,
+    excluded: np.ndarray | None = None,
+    num_starts: int = 64,
+    max_swaps: int = 100,
+) -> np.ndarray | None:
+    """
+    Finds a good valid lineup without a solver, by hill climbing from the best of a few random valid lineups
+
+    Each step scores every single-draftable swap at once, and makes the valid swap that increases the projection the
+    most, so the lineup stays valid throughout. Lineups drafting the same players as a lineup in `excluded` are never
+    returned
+
+    Returns
+    -------
+    lineup: np.ndarray | None
+        The positions of the drafted players in `contest.draftables`, or None if no valid lineup could be found
+    """
+    projections = np.nan_to_num(np.asarray(projections, dtype="float64"))
+    excluded_keys = get_player_keys(excluded, lookups) if excluded is not None and len(excluded) else None
+
+    def allowed(lineups: np.ndarray) -> np.ndarray:
+        valid, _ = validate_lineups(lineups, lookups)
+        if excluded_keys is not None:
+            valid &= ~np.isin(get_player_keys(lineups, lookups), excluded_keys)
+        return valid
+
+    starts = sample_lineups(lookups, num_starts, np.random.default_rng(0))
+    starts = starts[allowed(starts)] if len(starts) else starts
+    if len(starts) == 0:
+        return None
+
+    lineup = starts[np.argmax(projections[starts].sum(axis=1))]
+
+    # the draftables that could replace the draftable at each position of the lineup
+    roster_slot_pools = get_roster_slot_pools(lookups)
+    swap_pools = [roster_slot_pools[lookups.roster_slots[position]] for position in lineup]
+    swap_slots = np.repeat(np.arange(len(lineup)), [len(pool) for pool in swap_pools])
+    swap_draftables = np.concatenate(swap_pools)
+
+    for _ in range(max_swaps):
+        candidates = np.tile(lineup, (len(swap_draftables), 1))
+        candidates[np.arange(len(swap_draftables)), swap_slots] = swap_draftables
+
+        gains = projections[swap_draftables] - projections[lineup[swap_slots]]
+        gains[~allowed(candidates)] = -np.inf
+
+        best_swap = np.argmax(gains)
+        if gains[best_swap] <= 0:
+            break
+
+        lineup = candidates[best_swap]
+
+    return lineup
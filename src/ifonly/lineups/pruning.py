@@ -0,0 +1,74 @@
+from ifonly import Contest
+import pandas as pd
+import numpy as np
+
+
+def get_undominated_positions(contest: Contest, keep: int = 1, min_projection: float = -np.inf) -> np.ndarray:
+    """
+    Returns the positions in `contest.draftables` of the draftables that could appear in one of the `keep` best lineups
+
+    A draftable is dominated by another draftable in the same roster slot that costs no more and is projected to score
+    at least as much. Swapping a dominated draftable for one of its dominators never makes a lineup worse, so it can be
+    removed as long as it has more dominators than could ever be unavailable:
+        - `num_to_draft - 1` could be the same players as the rest of the lineup
+        - `keep - 1` more could be needed to make the other lineups of a top-`keep` sample
+        - when lineups must draft from multiple games, the dominators from any one game could all be unavailable
+
+    Parameters
+    ----------
+    contest: Contest
+        The contest to prune the draftables of
+    keep: int
+        The number of best lineups that must be preserved
+    min_projection: float
+        Draftables projected below this are always removed
+
+    Returns
+    -------
+    positions: np.ndarray
+        The sorted positions of the draftables that are kept
+    """
+    draftables = contest.draftables
+    salaries = draftables.salary.to_numpy()
+    projections = np.nan_to_num(contest.draftable_projections)
+    roster_slots = draftables.roster_slot_id.to_numpy()
+    players = pd.factorize(draftables.player_id)[0]
+    games = pd.factorize(draftables.competition_id)[0]
+
+    num_to_draft = contest.lineup_reqs.sum()
+    must_choose_from_multiple_games = (contest.contest_type_id not in {81, 93}) and (
+        contest.draft_group.games_count > 1
+    )
+
+    kept = projections >= min_projection
+    for roster_slot_id in np.unique(roster_slots):
+        slot = np.flatnonzero(roster_slots == roster_slot_id)
+        salary, projection = salaries[slot], projections[slot]
+
+        # dominates[i, j] is True when draftable j dominates draftable i, ties are broken by position
+        dominates = (
+            (salary[None, :] <= salary[:, None])
+            & (projection[None, :] >= projection[:, None])
+            & (
+                (salary[None, :] < salary[:, None])
+                | (projection[None, :] > projection[:, None])
+                | (slot[None, :] < slot[:, None])
+            )
+        )
+
+        # count distinct players, since the same player can only be drafted once
+        player_codes, slot_players = np.unique(players[slot], return_inverse=True)
+        dominating_players = (dominates.astype("int32") @ np.eye(len(player_codes), dtype="int32")[slot_players]) > 0
+        num_dominators = dominating_players.sum(axis=1)
+
+        prunable = num_dominators >= num_to_draft - 1 + keep
+
+        if must_choose_from_multiple_games:
+            player_games = np.zeros((len(player_codes), games.max() + 1), dtype="int32")
+            player_games[slot_players, games[slot]] = 1
+            most_dominators_in_one_game = (dominating_players.astype("int32") @ player_games).max(axis=1)
+            prunable &= num_dominators - most_dominators_in_one_game >= keep
+
+        kept[slot[prunable]] = False
+
+    return np.flatnonzero(kept)
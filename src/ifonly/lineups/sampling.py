@@ -0,0 +1,74 @@
+from ifonly.lineups.validate import LineupLookups, validate_lineups
+from typing import List
+import numpy as np
+
+
+def get_roster_slot_pools(lookups: LineupLookups) -> List[np.ndarray]:
+    """
+    Returns the positions of the draftables that can fill each roster slot, leaving out any draftable that can't fit
+    under the salary cap even when the rest of the lineup is filled with the cheapest draftables available
+    """
+    pools = [np.flatnonzero(lookups.roster_slots == code) for code in range(len(lookups.slot_reqs))]
+    if any(len(pool) < count for pool, count in zip(pools, lookups.slot_reqs)):
+        return [pool[:0] for pool in pools]
+
+    sorted_salaries = [np.sort(lookups.salaries[pool]).astype("int64") for pool in pools]
+    cheapest_fill = np.array([salaries[:count].sum() for salaries, count in zip(sorted_salaries, lookups.slot_reqs)])
+    cheapest_fill_but_one = np.array(
+        [salaries[: count - 1].sum() for salaries, count in zip(sorted_salaries, lookups.slot_reqs)]
+    )
+    cheapest_rest_of_lineup = cheapest_fill.sum() - cheapest_fill + cheapest_fill_but_one
+
+    return [
+        pool[lookups.salaries[pool] + cheapest_rest <= lookups.salary_cap]
+        for pool, cheapest_rest in zip(pools, cheapest_rest_of_lineup)
+    ]
+
+
+def sample_lineups(
+    lookups: LineupLookups,
+    num_lineups: int,
+    rng: np.random.Generator,
+    batch_size: int = 1024,
+    max_batches: int = 100,
+) -> np.ndarray:
+    """
+    Draws batches of random lineups, keeping the valid and distinct ones until `num_lineups` have been found
+
+    Each roster slot is filled by sampling without replacement from the draftables that can fill it, so a batch is a
+    handful of array operations no matter how many lineups it holds. Fewer than `num_lineups` lineups are returned if
+    `max_batches` batches don't turn up enough of them
+
+    Returns
+    -------
+    lineups: np.ndarray
+        An array of shape (lineups, roster size) holding the positions of each drafted player in `contest.draftables`
+    """
+    pools = get_roster_slot_pools(lookups)
+    roster_size = int(lookups.slot_reqs.sum())
+    if any(len(pool) < count for pool, count in zip(pools, lookups.slot_reqs)):
+        return np.empty((0, roster_size), dtype="int32")
+
+    found = np.empty((0, roster_size), dtype="int32")
+    for _ in range(max_batches):
+        roster_slot_picks = []
+        for pool, count in zip(pools, lookups.slot_reqs):
+            if count == 1:
+                picks = rng.integers(len(pool), size=(batch_size, 1))
+            else:
+                # the `count` smallest of a row of uniform draws are a uniform sample without replacement
+                picks = np.argpartition(rng.random((batch_size, len(pool))), count - 1, axis=1)[:, :count]
+            roster_slot_picks.append(pool[picks])
+
+        candidates = np.hstack(roster_slot_picks).astype("int32")
+        valid, _ = validate_lineups(candidates, lookups)
+        found = np.concatenate([found, candidates[valid]])
+
+        # lineups are the same if they draft the same draftables, regardless of the order they were drafted in
+        _, first_seen = np.unique(np.sort(found, axis=1), axis=0, return_index=True)
+        found = found[np.sort(first_seen)]
+
+        if len(found) >= num_lineups:
+            break
+
+    return found[:num_lineups]
@@ -0,0 +1,231 @@
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from dataclasses import dataclass, field
+from tempfile import TemporaryDirectory
+from pathlib import Path
+from typing import Callable, Dict, Hashable, Iterable, Tuple, TypeVar, TYPE_CHECKING
+import numpy as np
+import subprocess
+import itertools
+import logging
+import time
+import re
+import os
+
+if TYPE_CHECKING:
+    from pyomo.core.base.PyomoModel import ConcreteModel
+
+logger = logging.getLogger(__name__)
+
+DRAFTED_LABEL = re.compile(r"drafted\((\d+)\)")
+GAP_LINE = re.compile(r"^Gap:\s+(\S+)", re.MULTILINE)
+NODES_LINE = re.compile(r"^Enumerated nodes:\s+(\d+)", re.MULTILINE)
+
+# settings that change how models are built, instead of being passed to the solver
+MODEL_SETTINGS = {"scale_salaries"}
+
+# the keys problems are dispatched with, e.g. draft group ids
+Key = TypeVar("Key", bound=Hashable)
+
+# Pyomo termination conditions that can still leave a feasible (but possibly not optimal) solution in the model
+FEASIBLE_TERMINATIONS = {"optimal", "maxTimeLimit", "maxIterations", "maxEvaluations", "minFunctionValue"}
+
+
+@dataclass
+class SolverResult:
+    status: str
+    objective: float
+    wall_time: float
+    values: Dict[int, float] = field(default_factory=dict)
+    gap: float = np.nan
+    nodes: float = np.nan
+
+    @property
+    def is_optimal(self) -> bool:
+        return self.status == "Optimal"
+
+    @property
+    def has_solution(self) -> bool:
+        # e.g. "Stopped on time" still has an integer solution, "Stopped on time (no integer solution ...)" doesn't
+        return self.is_optimal or (self.status.startswith("Stopped") and "no integer" not in self.status)
+
+
+def supports_dispatch(solver: dict | None) -> bool:
+    """The dispatcher drives the CBC executable directly, so it can't be used for other or persistent solvers"""
+    return solver is not None and solver["name"] == "cbc" and not solver["persistent"]
+
+
+def get_contest_type_settings(solver: dict, contest_type_id: int | None) -> dict:
+    """Returns the settings tuned for `contest_type_id` (by `python -m ifonly tune`), which override the solver's"""
+    return solver.get("contest_types", {}).get(str(contest_type_id), {})
+
+
+def get_solver_options(solver: dict, contest_type_id: int | None = None) -> Dict[str, float | str]:
+    """
+    Translates the solver-independent `time_limit` (seconds) and `mip_gap` settings into CBC options, along with any
+    CBC `options` of the solver and the ones tuned for `contest_type_id`
+    """
+    options: Dict[str, float | str] = {}
+    if solver["name"] != "cbc":
+        return options
+
+    if "time_limit" in solver:
+        options["sec"] = solver["time_limit"]
+    if "mip_gap" in solver:
+        options["ratio"] = solver["mip_gap"]
+
+    options.update(solver.get("options", {}))
+    contest_type_settings = get_contest_type_settings(solver, contest_type_id)
+    options.update({key: value for key, value in contest_type_settings.items() if key not in MODEL_SETTINGS})
+    return options
+
+
+def scales_salaries(solver: dict, contest_type_id: int | None = None) -> bool:
+    """Whether the salary constraint is divided by the gcd of the salaries"""
+    return get_contest_type_settings(solver, contest_type_id).get("scale_salaries", solver.get("scale_salaries", True))
+
+
+def get_pyomo_gap(sol) -> float:
+    """Returns the relative gap between the bounds in the results of `opt.solve`"""
+    if str(sol.solver.termination_condition) == "optimal":
+        return 0.0
+
+    try:
+        upper_bound, lower_bound = float(sol.problem.upper_bound), float(sol.problem.lower_bound)
+        return abs(upper_bound - lower_bound) / max(abs(upper_bound), abs(lower_bound), 1e-9)
+    except (TypeError, ValueError, AttributeError):
+        return np.nan
+
+
+def clear_drafted(model: "ConcreteModel") -> None:
+    """
+    Forgets the values of the last solve of `model`, so a solve that stops without loading a solution (e.g. on the time
+    limit before finding an incumbent) can't be mistaken for one that found the same lineup again
+    """
+    for var in model.drafted.values():  # type: ignore
+        if not var.fixed:
+            var.set_value(None)
+
+
+def has_pyomo_solution(sol, model: "ConcreteModel") -> bool:
+    """Whether the results of `opt.solve` hold a solution that was loaded into `model`, cleared before the solve"""
+    return str(sol.solver.termination_condition) in FEASIBLE_TERMINATIONS and any(
+        var.value is not None for var in model.drafted.values() if not var.fixed  # type: ignore
+    )
+
+
+def get_pyomo_nodes(sol) -> float:
+    """Returns the number of branch and bound nodes in the results of `opt.solve`, if the solver reported it"""
+    try:
+        return float(sol.solver.statistics.branch_and_bound.number_of_created_subproblems)
+    except (TypeError, ValueError, AttributeError):
+        return np.nan
+
+
+def write_problem(model: "ConcreteModel", problem_file: Path) -> None:
+    model.write(str(problem_file), io_options={"symbolic_solver_labels": True})
+
+
+def read_solution(solution_file: Path, wall_time: float, log: str = "") -> SolverResult:
+    with open(solution_file) as f:
+        header = f.readline()
+        values = {}
+        for line in f:
+            # each line is "<column> <name> <value> <reduced cost>"
+            _, name, value, *_ = line.split()
+            if match := DRAFTED_LABEL.fullmatch(name):
+                values[int(match.group(1))] = float(value)
+
+    status, _, objective = header.partition(" - objective value ")
+    status = status.strip()
+
+    if gap_line := GAP_LINE.search(log):
+        gap = float(gap_line.group(1))
+    else:
+        gap = 0.0 if status == "Optimal" else np.nan
+
+    nodes = float(nodes_line.group(1)) if (nodes_line := NODES_LINE.search(log)) else np.nan
+
+    return SolverResult(
+        status=status, objective=float(objective or "nan"), wall_time=wall_time, values=values, gap=gap, nodes=nodes
+    )
+
+
+def get_model_solver_options(model: "ConcreteModel") -> Dict[str, float | str] | None:
+    """Returns the options `model` was built with for its contest type (see `get_solver_options`), if it was"""
+    return getattr(model, "solver_options", None)
+
+
+def run_solver(problem_file: Path, solver: dict, options: Dict[str, float | str] | None = None) -> SolverResult:
+    """Solves `problem_file` with `options`, or the solver's own options if they aren't given"""
+    solution_file = problem_file.with_suffix(".sol")
+    if options is None:
+        options = get_solver_options(solver)
+    arguments = [str(arg) for option, value in options.items() for arg in (f"-{option}", value)]
+    command = [solver["executable"], str(problem_file), *arguments, "-solve", "-solu", str(solution_file)]
+
+    started_at = time.perf_counter()
+    completed = subprocess.run(command, check=True, capture_output=True, text=True)
+    return read_solution(solution_file, time.perf_counter() - started_at, completed.stdout)
+
+
+def load_solution(model: "ConcreteModel", result: SolverResult) -> None:
+    # CBC only writes the columns that are non-zero in its solution
+    for var in model.drafted.values():  # type: ignore
+        if not var.fixed:
+            var.set_value(0)
+
+    for idx, value in result.values.items():
+        model.drafted[idx].set_value(round(value))  # type: ignore
+
+
+class SolverDispatcher:
+    """
+    Solves many models at once by writing each one to a problem file and running a bounded pool of solver
+    subprocesses. Models are built, written and updated in the calling thread, the pool only waits on the solvers
+    """
+
+    def __init__(self, solver: dict):
+        self.solver = solver
+        self.max_workers = solver.get("concurrent_solves", os.cpu_count() or 1)
+
+    def solve(
+        self,
+        problems: Iterable[Tuple[Key, "ConcreteModel"]],
+        on_solution: Callable[[Key, "ConcreteModel", SolverResult], bool],
+    ) -> None:
+        """
+        Solves each (key, model) in `problems`, calling `on_solution(key, model, result)` as each solve completes with
+        the solution loaded into `model`. If `on_solution` returns True, the (possibly modified) model is solved again
+
+        A solve that fails (e.g. the solver crashes) is passed to `on_solution` as a result without a solution, so it
+        only costs its own problem a solution instead of stopping every other solve
+        """
+        problem_nums = itertools.count()
+
+        with TemporaryDirectory() as problem_dir, ThreadPoolExecutor(self.max_workers) as pool:
+            pending: Dict[Future, Tuple[Key, "ConcreteModel"]] = {}
+
+            def submit(key: Key, model: "ConcreteModel") -> None:
+                problem_file = Path(problem_dir) / f"{next(problem_nums)}.lp"
+                write_problem(model, problem_file)
+                options = get_model_solver_options(model)
+                pending[pool.submit(run_solver, problem_file, self.solver, options)] = (key, model)
+
+            for key, model in problems:
+                submit(key, model)
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    key, model = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        logger.warning(f"Failed to solve problem {key}: {e!r}")
+                        result = SolverResult(status=f"Failed ({type(e).__name__})", objective=np.nan, wall_time=np.nan)
+                        clear_drafted(model)
+                    else:
+                        load_solution(model, result)
+
+                    if on_solution(key, model, result):
+                        submit(key, model)
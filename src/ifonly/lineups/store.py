@@ -0,0 +1,102 @@
+# Persist generated lineups, so a run can be judged again without generating them again
+
+from ifonly import Contest
+from ifonly.lineups.batch import LineupBatch, PADDING
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+import datetime as dt
+import pandas as pd
+import numpy as np
+
+
+def get_lineups_file(lineups_dir: str | Path, run_id: int, date: dt.datetime, draft_group_id: int) -> Path:
+    return Path(lineups_dir) / str(run_id) / f"{date:%Y-%m-%d}-{draft_group_id}.npz"
+
+
+class LineupStore:
+    """
+    Collects the lineups generated for a set of contests and writes them to a single file
+
+    Lineups are stored as the draftable ids they draft (instead of positions in `contest.draftables`), so they can be
+    read back no matter how the day's tables are loaded
+    """
+
+    def __init__(self):
+        self.contest_ids: List[np.ndarray] = []
+        self.batches: List[LineupBatch] = []
+        self.draftable_ids: List[np.ndarray] = []
+
+    def add(self, contest: Contest, lineups: LineupBatch) -> None:
+        draftable_ids = np.append(contest.draftables.index.to_numpy(dtype="int64"), PADDING)
+        self.contest_ids.append(np.full(len(lineups), contest.contest_id, dtype="int64"))
+        self.batches.append(lineups)
+        self.draftable_ids.append(draftable_ids[lineups.positions])
+
+    def write(self, lineups_file: Path) -> None:
+        if not self.batches:
+            return
+
+        lineups = LineupBatch.concat(self.batches)
+        roster_size = lineups.positions.shape[1]
+        draftable_ids = np.full((len(lineups), roster_size), PADDING, dtype="int64")
+        start = 0
+        for ids in self.draftable_ids:
+            draftable_ids[start : start + len(ids), : ids.shape[1]] = ids
+            start += len(ids)
+
+        lineups_file.parent.mkdir(parents=True, exist_ok=True)
+        np.savez_compressed(
+            lineups_file,
+            contest_ids=np.concatenate(self.contest_ids),
+            draftable_ids=draftable_ids,
+            algorithm_codes=lineups.algorithm_codes,
+            algorithms=np.array(lineups.algorithms, dtype=str),
+            lineup_nums=lineups.lineup_nums,
+            mip_gaps=lineups.mip_gaps,
+            fallbacks=lineups.fallbacks,
+        )
+
+
+def read_lineups(lineups_dir: str | Path, run_id: int) -> Iterator[Tuple[dt.datetime, Dict[int, dict]]]:
+    """
+    Yields each date of a run with the stored lineups of each of its contests, as the arrays to build a `LineupBatch`
+    from with `get_stored_lineups`
+    """
+    lineups_files = sorted((Path(lineups_dir) / str(run_id)).glob("*.npz"))
+    if not lineups_files:
+        raise FileNotFoundError(f"No lineups were stored for run {run_id} in {lineups_dir}")
+
+    dates = pd.Series(lineups_files).map(lambda lineups_file: lineups_file.stem[:10])
+    for date, date_files in pd.Series(lineups_files).groupby(dates):
+        contests: Dict[int, dict] = {}
+        for lineups_file in date_files:
+            with np.load(lineups_file) as stored:
+                stored_arrays = {name: stored[name] for name in stored.files}
+
+            for contest_id in np.unique(stored_arrays["contest_ids"]):
+                mask = stored_arrays["contest_ids"] == contest_id
+                contests[int(contest_id)] = {
+                    name: values[mask] if name != "algorithms" else tuple(values)
+                    for name, values in stored_arrays.items()
+                    if name != "contest_ids"
+                }
+
+        yield dt.datetime.fromisoformat(date), contests
+
+
+def get_stored_lineups(stored: dict, contest: Contest) -> LineupBatch:
+    draftable_ids = stored["draftable_ids"]
+    positions = contest.draftables.index.get_indexer(draftable_ids.ravel()).reshape(draftable_ids.shape)
+    positions[draftable_ids == PADDING] = PADDING
+
+    if np.any(positions[draftable_ids != PADDING] == -1):
+        raise KeyError(f"Stored lineups for contest {contest.contest_id} draft players that aren't in its draft group")
+
+    return LineupBatch(
+        positions,
+        stored["algorithm_codes"],
+        stored["algorithms"],
+        stored["lineup_nums"],
+        stored["mip_gaps"],
+        stored["fallbacks"],
+    )
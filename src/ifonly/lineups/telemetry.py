@@ -0,0 +1,77 @@
+# Records how hard every MILP solve was, so slow contest types can be found and their solver settings tuned
+
+from ifonly import Contest
+from ifonly.lineups.solvers import get_model_solver_options
+from pathlib import Path
+from typing import List, TYPE_CHECKING
+import datetime as dt
+import pandas as pd
+import numpy as np
+import threading
+import json
+
+if TYPE_CHECKING:
+    from pyomo.core.base.PyomoModel import ConcreteModel
+
+# the solves of this process that haven't been written yet
+_solve_records: List[dict] = []
+_lock = threading.Lock()
+
+
+def get_telemetry_file(telemetry_dir: str | Path, run_id: int, date: dt.datetime, draft_group_id: int) -> Path:
+    return Path(telemetry_dir) / str(run_id) / f"{date:%Y-%m-%d}-{draft_group_id}.csv"
+
+
+def record_solve(
+    algorithm: str,
+    contest: Contest,
+    model: "ConcreteModel",
+    status: str,
+    wall_time: float,
+    gap: float,
+    nodes: float = np.nan,
+) -> None:
+    """
+    Records a solve of `model`, which was built for `contest`. A model that's solved again (e.g. with a cut for each
+    lineup it already found) is recorded once per solve, and its build time is only counted by the first one
+    """
+    solve_num = getattr(model, "solve_num", 0)
+    model.solve_num = solve_num + 1
+
+    record = {
+        "date": contest.day.date,
+        "contest_id": contest.contest_id,
+        "draft_group_id": contest.draft_group_id,
+        "contest_type_id": contest.contest_type_id,
+        "algorithm": algorithm,
+        "solve_num": solve_num,
+        "build_time": getattr(model, "build_time", np.nan) if solve_num == 0 else 0.0,
+        "wall_time": wall_time,
+        "keep": getattr(model, "keep", np.nan),  # the number of lineups the model was pruned for
+        "variables": model.nvariables(),
+        "constraints": model.nconstraints(),
+        "nodes": nodes,
+        "gap": gap,
+        "status": status,
+        "options": json.dumps(get_model_solver_options(model) or {}, sort_keys=True),
+    }
+
+    with _lock:
+        _solve_records.append(record)
+
+
+def pop_solve_records() -> pd.DataFrame:
+    """Returns (and forgets) every solve this process recorded since the last call"""
+    global _solve_records
+    with _lock:
+        solve_records, _solve_records = _solve_records, []
+
+    return pd.DataFrame(solve_records)
+
+
+def read_telemetry(telemetry_dir: str | Path, run_id: int) -> pd.DataFrame:
+    telemetry_files = sorted((Path(telemetry_dir) / str(run_id)).glob("*.csv"))
+    if not telemetry_files:
+        raise FileNotFoundError(f"No solves were recorded for run {run_id} in {telemetry_dir}")
+
+    return pd.concat([pd.read_csv(file, parse_dates=["date"]) for file in telemetry_files], ignore_index=True)
@@ -0,0 +1,139 @@
+# Replays the solves recorded in a run's telemetry with candidate solver settings, to find the fastest settings for
+# each contest type
+
+from ifonly.history.contests import get_contests
+from ifonly.lineups import load_algorithm
+from ifonly.lineups.solvers import get_model_solver_options, run_solver, write_problem
+from ifonly.lineups.telemetry import read_telemetry
+from tempfile import TemporaryDirectory
+from pathlib import Path
+from typing import Dict, List
+import pandas as pd
+import numpy as np
+import itertools
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+# the settings that can be tuned, `scale_salaries` changes how models are built and the rest are CBC options
+CANDIDATE_SETTINGS = ["threads", "presolve", "cuts", "scale_salaries"]
+
+
+def get_candidates(tuning: dict) -> List[dict]:
+    """
+    Returns every combination of the values listed for each setting in `tuning`, after the solver's own settings
+    (the empty candidate) that every other candidate is compared against
+    """
+    keys = [key for key in CANDIDATE_SETTINGS if key in tuning]
+    candidates = [dict(zip(keys, values)) for values in itertools.product(*(tuning[key] for key in keys))]
+    return [{}] + [candidate for candidate in candidates if candidate]
+
+
+def tune(run_id: int, parameters: dict, solver_name: str = "cbc") -> Dict[str, dict]:
+    """
+    Solves a sample of the first solves of each contest type in run `run_id` again with every candidate setting, and
+    picks the candidate that solved them fastest without finding a worse lineup than any other candidate
+
+    Returns
+    -------
+    tuned_settings: Dict[str, dict]
+        The best candidate for each contest type, keyed by contest type id as they're keyed in the solver's
+        `contest_types`
+    """
+    tuning = parameters.get("tuning", {})
+    solver = parameters["solvers"][solver_name]
+    candidates = get_candidates(tuning)
+
+    algorithm_names = [
+        name for name, algorithm in parameters["algorithms"].items() if algorithm.get("solver") == solver_name
+    ]
+    telemetry = read_telemetry(parameters.get("telemetry_dir", "results/telemetry"), run_id)
+    first_solves = telemetry.loc[(telemetry.solve_num == 0) & telemetry.algorithm.isin(algorithm_names)]
+    sampled_solves = (
+        first_solves.sample(frac=1, random_state=0).groupby("contest_type_id").head(tuning.get("sample_size", 10))
+    )
+    logger.info(f"Replaying {len(sampled_solves)} solves of run {run_id} with {len(candidates)} candidate settings")
+
+    trials: List[dict] = []
+    with TemporaryDirectory() as problem_dir:
+        for date, date_solves in sampled_solves.groupby("date"):
+            contests_generator = get_contests(date, parameters.get("standings_bins"))
+            next(contests_generator, 0)
+            contests = {contest.contest_id: contest for contest in contests_generator}
+
+            for solve in date_solves.itertuples():
+                if solve.contest_id not in contests:
+                    logger.warning(f"Skipping contest {solve.contest_id}, it could not be loaded")
+                    continue
+
+                contest = contests[solve.contest_id]
+                algorithm = load_algorithm(solve.algorithm)
+
+                for candidate_num, candidate in enumerate(candidates):
+                    # candidates replace any settings that were already tuned for the contest type
+                    candidate_solver = {**solver, "contest_types": {str(contest.contest_type_id): candidate}}
+                    algorithm_parameters = {**parameters["algorithms"][solve.algorithm], "solver": candidate_solver}
+                    # pruned the same as the recorded model, or the default way for runs recorded before `keep`
+                    if not pd.isna(getattr(solve, "keep", np.nan)):
+                        algorithm_parameters["keep"] = int(solve.keep)
+                    model = algorithm.build_problem(contest, **algorithm_parameters)
+
+                    problem_file = Path(problem_dir) / f"{len(trials)}.lp"
+                    write_problem(model, problem_file)
+                    result = run_solver(problem_file, candidate_solver, get_model_solver_options(model))
+
+                    trials.append(
+                        {
+                            "contest_type_id": contest.contest_type_id,
+                            "contest_id": contest.contest_id,
+                            "algorithm": solve.algorithm,
+                            "candidate": candidate_num,
+                            "wall_time": result.wall_time,
+                            "nodes": result.nodes,
+                            "objective": result.objective if result.has_solution else float("nan"),
+                        }
+                    )
+
+    if not trials:
+        return {}
+
+    trials_df = pd.DataFrame(trials)
+
+    # candidates that stop early (e.g. on the time limit) can be fast by finding worse lineups, so they're excluded
+    best_objective = trials_df.groupby(["contest_id", "algorithm"]).objective.transform("max")
+    tolerance = solver.get("mip_gap", 0) * best_objective.abs() + 1e-6
+    trials_df["valid"] = trials_df.objective >= best_objective - tolerance
+
+    scores = trials_df.groupby(["contest_type_id", "candidate"]).agg(
+        wall_time=("wall_time", "sum"), nodes=("nodes", "sum"), valid=("valid", "all")
+    )
+
+    tuned_settings = {}
+    for contest_type_id, type_scores in scores.groupby(level="contest_type_id"):
+        valid_scores = type_scores.loc[type_scores.valid].droplevel("contest_type_id")
+        if valid_scores.empty:
+            logger.warning(f"No candidate found the best lineups for contest type {contest_type_id}")
+            continue
+
+        best = int(valid_scores.wall_time.idxmin())
+        default_time = type_scores.wall_time.iloc[0]
+        logger.info(
+            f"Contest type {contest_type_id}: {json.dumps(candidates[best])} solved in "
+            f"{valid_scores.wall_time.loc[best]:.2f}s ({valid_scores.nodes.loc[best]:.0f} nodes), "
+            f"{default_time:.2f}s with the solver's own settings"
+        )
+        tuned_settings[str(contest_type_id)] = candidates[best]
+
+    return tuned_settings
+
+
+def write_tuned_settings(tuned_settings: Dict[str, dict], tuning_file: str | Path) -> None:
+    """Writes the settings of each contest type as a TOML table, which `load_parameters` reads into `contest_types`"""
+    lines = ["# Written by `python -m ifonly tune`, the fastest solver settings found for each contest type"]
+    for contest_type_id, settings in sorted(tuned_settings.items(), key=lambda item: int(item[0])):
+        lines.append(f'\n["{contest_type_id}"]')
+        # json.dumps writes strings, numbers and booleans the same way TOML does
+        lines.extend(f"{key} = {json.dumps(value)}" for key, value in settings.items())
+
+    Path(tuning_file).write_text("\n".join(lines) + "\n")
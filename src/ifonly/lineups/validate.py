@@ -1,30 +1,103 @@
 # Validate lineup submissions
 
-from ifonly.history.contests import Contest
+from ifonly.history.contests import Contest, get_salary_cap
+from dataclasses import dataclass
+from typing import Tuple
 import pandas as pd
+import numpy as np
 
-MAX_SALARY = 50_000
+# Rules are checked in this order, and a lineup is reported as failing the first rule it breaks
+RULES = ("draftables", "salary", "roster_slots", "teams", "unique_players")
+VALID = -1
 
 
-def is_valid_lineup(lineup: pd.DataFrame, contest: Contest) -> bool:
+@dataclass
+class LineupLookups:
+    """
+    Per-draft-group arrays aligned with the positions of `contest.draftables`, so that lineups can be validated as
+    (lineups x roster size) arrays of draftable positions
+    """
+
+    salaries: np.ndarray
+    roster_slots: np.ndarray  # codes into `slot_reqs`, unknown roster slots are coded as len(slot_reqs)
+    teams: np.ndarray
+    players: np.ndarray
+    slot_reqs: np.ndarray
+    salary_cap: float
+
+    @classmethod
+    def from_contest(cls, contest: Contest) -> "LineupLookups":
+        draftables = contest.draftables
+        roster_slots = pd.Categorical(draftables.roster_slot_id, categories=contest.lineup_reqs.index).codes
+        num_slots = len(contest.lineup_reqs)
+
+        return cls(
+            salaries=draftables.salary.to_numpy(dtype="int32"),
+            roster_slots=np.where(roster_slots < 0, num_slots, roster_slots).astype("int16"),
+            teams=pd.factorize(draftables.team)[0].astype("int32"),
+            players=pd.factorize(draftables.player_id)[0].astype("int32"),
+            slot_reqs=contest.lineup_reqs.to_numpy(dtype="int16"),
+            salary_cap=get_salary_cap(contest.draft_group.contest_type_id),
+        )
+
+    def __len__(self) -> int:
+        return len(self.salaries)
+
+
+def validate_lineups(lineups: np.ndarray, lookups: LineupLookups) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Validates many lineups at once
+
+    Parameters
+    ----------
+    lineups: np.ndarray
+        An integer array of shape (lineups, roster size) holding the positions of each drafted player in
+        `contest.draftables`
+    lookups: LineupLookups
+        The lookup arrays of the draft group the lineups were drafted from
+
+    Returns
+    -------
+    valid: np.ndarray
+        A boolean mask that is True for each lineup that passes every rule
+    failed_rule: np.ndarray
+        The index into `RULES` of the first rule each lineup failed, or `VALID` if it didn't fail any
+    """
+    lineups = np.atleast_2d(np.asarray(lineups))
+    num_lineups, roster_size = lineups.shape
+    failed_rule = np.full(num_lineups, VALID, dtype="int8")
+
+    def record_failures(rule: str, failed: np.ndarray | np.bool_) -> None:
+        failed_rule[(failed_rule == VALID) & failed] = RULES.index(rule)
+
+    # check draftables are as they appear in the contest
+    in_contest = (lineups >= 0) & (lineups < len(lookups))
+    record_failures("draftables", ~in_contest.all(axis=1))
+    lineups = np.where(in_contest, lineups, 0)
+
     # check salary is under the limit
-    if lineup.salary.sum() > MAX_SALARY:
-        return False
+    record_failures("salary", lookups.salaries[lineups].sum(axis=1, dtype="int64") > lookups.salary_cap)
 
-    # check position requirements are met
-    if lineup.groupby("roster_slot_id").size().ne(contest.lineup_reqs).any():
-        return False
+    # check position requirements are met, using one bincount over (lineup, roster slot) pairs
+    num_slots = len(lookups.slot_reqs) + 1
+    slot_keys = lookups.roster_slots[lineups] + num_slots * np.arange(num_lineups)[:, None]
+    slot_counts = np.bincount(slot_keys.ravel(), minlength=num_lineups * num_slots).reshape(num_lineups, num_slots)
+    record_failures("roster_slots", (slot_counts != np.append(lookups.slot_reqs, 0)).any(axis=1))
 
     # check team requirements are met
-    if lineup.team.nunique() < 2:
-        return False
-
-    # check draftable_ids are as they appear in the contest
-    if lineup.index.droplevel().difference(contest.draftables.index).size > 0:
-        return False
+    teams = np.sort(lookups.teams[lineups], axis=1)
+    num_teams = 1 + np.count_nonzero(np.diff(teams, axis=1), axis=1)
+    record_failures("teams", (num_teams < 2) | (roster_size == 0))
 
     # check for unique player IDs
-    if not lineup.player_id.is_unique:
-        return False
+    players = np.sort(lookups.players[lineups], axis=1)
+    record_failures("unique_players", (np.diff(players, axis=1) == 0).any(axis=1))
+
+    return failed_rule == VALID, failed_rule
 
-    return True
+
+def is_valid_lineup(lineup: pd.DataFrame, contest: Contest) -> bool:
+    draftable_ids = lineup.index.get_level_values("draftable_id")
+    positions = contest.draftables.index.get_indexer(draftable_ids)
+    valid, _ = validate_lineups(positions[None, :], LineupLookups.from_contest(contest))
+    return bool(valid[0])
@@ -0,0 +1,265 @@
+# A long-lived local server for ad-hoc experiments (judging a hand-built lineup, trying an algorithm on one contest),
+# which keeps recently used days and the caches of the algorithms run on them in memory between requests
+
+from ifonly import Contest, DayBundle
+from ifonly.history.contests import get_contests, load_day
+from ifonly.judge import get_contest_payouts
+from ifonly.lineups import load_algorithm
+from ifonly.lineups.algorithms import CachedAlgorithm
+from ifonly.lineups.batch import LineupBatch, PADDING
+from ifonly.lineups.generate import prepare_generation_algorithms, run_generation_algorithms
+from ifonly.lineups.telemetry import pop_solve_records
+from ifonly.lineups.validate import RULES, VALID, LineupLookups, validate_lineups
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Tuple
+from urllib.parse import parse_qs, urlparse
+import datetime as dt
+import pandas as pd
+import numpy as np
+import threading
+import json
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CachedDay:
+    """A loaded day with its contests, and the algorithms (with their caches) that were run on it"""
+
+    day: DayBundle
+    contests: Dict[int, Contest]
+    algorithms: Dict[Tuple[str, str], CachedAlgorithm] = field(default_factory=dict)
+    # algorithm caches aren't safe to share between threads, so the day's algorithms are run one request at a time
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+class DayCache:
+    """
+    The `max_days` most recently used days, the least recently used day (and the models its algorithms cached) is
+    dropped to make room for a new one. A day that's requested by many threads at once is only loaded once
+    """
+
+    def __init__(self, max_days: int, standings_bins: int | None = None):
+        self.max_days = max_days
+        self.standings_bins = standings_bins
+        self.days: OrderedDict[dt.datetime, CachedDay] = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading: Dict[dt.datetime, threading.Lock] = {}
+
+    def get(self, date: dt.datetime) -> CachedDay:
+        with self._lock:
+            if date in self.days:
+                self.days.move_to_end(date)
+                return self.days[date]
+            date_lock = self._loading.setdefault(date, threading.Lock())
+
+        with date_lock:
+            with self._lock:
+                if date in self.days:
+                    return self.days[date]
+
+            try:
+                started_at = time.perf_counter()
+                day = load_day(date, self.standings_bins)
+                contests_generator = get_contests(date, self.standings_bins, day)
+                next(contests_generator, 0)
+                cached_day = CachedDay(day, {contest.contest_id: contest for contest in contests_generator})
+                logger.info(f"Loaded {date:%Y-%m-%d} in {time.perf_counter() - started_at:.2f}s")
+            except BaseException:
+                with self._lock:
+                    self._loading.pop(date, None)
+                raise
+
+            # a thread that misses the day after it's no longer loading always finds it cached
+            with self._lock:
+                self._loading.pop(date, None)
+                self.days[date] = cached_day
+                while len(self.days) > self.max_days:
+                    evicted, _ = self.days.popitem(last=False)
+                    logger.info(f"Evicted {evicted:%Y-%m-%d}")
+
+        return cached_day
+
+    def cached_dates(self) -> List[str]:
+        with self._lock:
+            return [f"{date:%Y-%m-%d}" for date in self.days]
+
+
+def to_records(frame: pd.DataFrame) -> List[dict]:
+    """Converts a frame to JSON-ready rows, with NaN as None"""
+    return json.loads(frame.to_json(orient="records"))
+
+
+class QueryService:
+    """The queries the server answers, each one takes and returns JSON-ready values"""
+
+    def __init__(self, parameters: dict, max_days: int = 3):
+        self.parameters = parameters
+        self.days = DayCache(max_days, parameters.get("standings_bins"))
+
+    def get_contest(self, query: dict) -> Tuple[CachedDay, Contest]:
+        cached_day = self.days.get(dt.datetime.fromisoformat(query["date"]))
+        contest_id = int(query["contest_id"])
+        if contest_id not in cached_day.contests:
+            raise KeyError(f"Contest {contest_id} isn't one of the contests entered on {query['date']}")
+        return cached_day, cached_day.contests[contest_id]
+
+    def status(self, query: dict) -> dict:
+        return {"cached_days": self.days.cached_dates(), "max_days": self.days.max_days}
+
+    def list_contests(self, query: dict) -> List[dict]:
+        cached_day = self.days.get(dt.datetime.fromisoformat(query["date"]))
+        return [
+            {
+                "contest_id": int(contest.contest_id),
+                "name": contest.details["name"],
+                "draft_group_id": int(contest.draft_group_id),
+                "contest_type_id": int(contest.contest_type_id),
+                "max_entries": int(contest.max_entries),
+                "entries": contest.num_entries,
+                "entry_fee": float(contest.details.entry_fee),
+                "draftables": contest.draftables_stop - contest.draftables_start,
+            }
+            for contest in cached_day.contests.values()
+        ]
+
+    def list_draftables(self, query: dict) -> List[dict]:
+        _, contest = self.get_contest(query)
+        draftables = contest.draftables.assign(projection=contest.draftable_projections)
+        return to_records(
+            draftables.reset_index()[["draftable_id", "name", "team", "salary", "roster_slot_id", "projection"]]
+        )
+
+    def generate(self, query: dict) -> List[dict]:
+        """
+        Generates lineups for a contest with `algorithm`, with the algorithm's settings in the configuration overridden
+        by `parameters`, and judges them. Algorithms are cached per day and settings, so solved models are reused
+        """
+        cached_day, contest = self.get_contest(query)
+        name = query["algorithm"]
+        overrides = query.get("parameters", {})
+        algorithm_parameters = {**self.parameters["algorithms"].get(name, {}), **overrides}
+        parameters = {**self.parameters, "algorithms": {name: algorithm_parameters}}
+
+        with cached_day.lock:
+            key = (name, json.dumps(overrides, sort_keys=True))
+            if key not in cached_day.algorithms:
+                cached_day.algorithms[key] = CachedAlgorithm(load_algorithm(name))
+            cached_algorithms = {cached_day.algorithms[key]}
+
+            started_at = time.perf_counter()
+            prepare_generation_algorithms([contest], cached_algorithms, parameters)
+            lineups = run_generation_algorithms(contest, cached_algorithms, parameters)
+            pop_solve_records()  # solves aren't recorded outside of runs
+            logger.info(
+                f"Generated {len(lineups)} lineups for contest {contest.contest_id} in "
+                f"{time.perf_counter() - started_at:.2f}s"
+            )
+
+        return self.judge_batch(lineups, contest)
+
+    def judge(self, query: dict) -> List[dict]:
+        """Validates and judges `lineups`, each a list of the draftable ids it drafts"""
+        _, contest = self.get_contest(query)
+        lineups = query["lineups"]
+        roster_size = max(map(len, lineups), default=0)
+
+        draftable_ids = np.full((len(lineups), roster_size), PADDING, dtype="int64")
+        for lineup_num, lineup in enumerate(lineups):
+            draftable_ids[lineup_num, : len(lineup)] = lineup
+
+        # draftable ids that aren't in the draft group become -1, which fails the "draftables" rule
+        positions = contest.draftables.index.get_indexer(draftable_ids.ravel()).reshape(draftable_ids.shape)
+        submitted_ids = [[int(draftable_id) for draftable_id in lineup] for lineup in lineups]
+        return self.judge_batch(LineupBatch.from_positions(positions, "submitted"), contest, submitted_ids)
+
+    def judge_batch(
+        self, lineups: LineupBatch, contest: Contest, submitted_ids: List[List[int]] | None = None
+    ) -> List[dict]:
+        """Judges `lineups`, listed with `submitted_ids` (including ids that aren't in the draft group) if given"""
+        _, failed_rule = validate_lineups(lineups.positions, LineupLookups.from_contest(contest))
+        draftable_ids = np.append(contest.draftables.index.to_numpy(dtype="int64"), PADDING)
+        if submitted_ids is None:
+            submitted_ids = [[int(i) for i in ids if i != PADDING] for ids in draftable_ids[lineups.positions]]
+
+        # invalid lineups are listed with the rule they failed, but aren't judged
+        payouts = get_contest_payouts(lineups, contest)
+        judged = payouts.where(np.broadcast_to((failed_rule == VALID)[:, None], payouts.shape)).reset_index()
+        judged.insert(2, "draftable_ids", submitted_ids)
+        judged["failed_rule"] = [None if rule == VALID else RULES[rule] for rule in failed_rule]
+        return to_records(judged)
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    server: "QueryServer"
+
+    ROUTES = {
+        ("GET", "/status"): "status",
+        ("GET", "/contests"): "list_contests",
+        ("GET", "/draftables"): "list_draftables",
+        ("POST", "/generate"): "generate",
+        ("POST", "/judge"): "judge",
+    }
+
+    def do_GET(self) -> None:
+        url = urlparse(self.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        self.respond("GET", url.path, query)
+
+    def do_POST(self) -> None:
+        try:
+            query = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        except json.JSONDecodeError as e:
+            return self.send_json(400, {"error": f"The request body isn't JSON: {e}"})
+        self.respond("POST", urlparse(self.path).path, query)
+
+    def respond(self, method: str, path: str, query: dict) -> None:
+        if (method, path) not in self.ROUTES:
+            return self.send_json(404, {"error": f"{method} {path} isn't an endpoint"})
+
+        try:
+            self.send_json(200, getattr(self.server.queries, self.ROUTES[method, path])(query))
+        except (KeyError, FileNotFoundError) as e:
+            self.send_json(404, {"error": f"Not found: {e}"})
+        except (ValueError, TypeError) as e:
+            self.send_json(400, {"error": str(e)})
+        except Exception as e:
+            logger.exception(f"Failed to answer {method} {path}")
+            self.send_json(500, {"error": repr(e)})
+
+    def send_json(self, status: int, body: Any) -> None:
+        encoded = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(encoded)))
+        self.end_headers()
+        self.wfile.write(encoded)
+
+    def log_message(self, format: str, *args) -> None:
+        logger.debug(format % args)
+
+
+class QueryServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], queries: QueryService):
+        super().__init__(address, QueryHandler)
+        self.queries = queries
+
+
+def serve(parameters: dict, host: str = "127.0.0.1", port: int = 8765, cached_days: int = 3) -> None:
+    """Answers queries on http://`host`:`port` until interrupted"""
+    server = QueryServer((host, port), QueryService(parameters, cached_days))
+    logger.info(f"Serving on http://{host}:{server.server_port}")
+    print(f"Serving on http://{host}:{server.server_port}, press Ctrl+C to stop")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
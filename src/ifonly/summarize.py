@@ -2,13 +2,16 @@ from ifonly import Contest
 import pandas as pd
 import datetime as dt
 import os
+import logging
+
+logger = logging.getLogger(__name__)
 
 # TODO: add projected pts
 # contest.projections.loc[lineup.index.get_level_values("draftable_id")].sum()
 
 
 def summarize_contest(payouts: pd.DataFrame, contest: Contest, run_id: int) -> pd.DataFrame:
-    algorithm_entries = payouts.groupby(level="algorithm").transform("size") + len(contest.standings)
+    algorithm_entries = payouts.groupby(level="algorithm").transform("size") + contest.num_entries
     return (
         payouts.reset_index()
         .assign(
@@ -31,6 +34,7 @@ def summarize_contest(payouts: pd.DataFrame, contest: Contest, run_id: int) -> p
                 "lineup_num",
                 "fpts",
                 "place",
+                "place_error",
                 "payout",
             ]
         )
@@ -40,7 +44,10 @@ def summarize_contest(payouts: pd.DataFrame, contest: Contest, run_id: int) -> p
 def summarize_runs(contest_summaries: pd.DataFrame, date: dt.datetime) -> None:
 
     run_summary = (
-        contest_summaries.assign(percentile=lambda df: (df.entries - df.place) / (df.entries - 1))
+        contest_summaries.assign(
+            percentile=lambda df: (df.entries - df.place) / (df.entries - 1),
+            percentile_error=lambda df: df.place_error / (df.entries - 1),
+        )
         .groupby(["run_id", "algorithm", "contest_type_id"])
         .agg(
             contests=("contest_id", "nunique"),
@@ -48,9 +55,18 @@ def summarize_runs(contest_summaries: pd.DataFrame, date: dt.datetime) -> None:
             entry_fees=("entry_fee", "sum"),
             payouts=("payout", "sum"),
             percentile=("percentile", "mean"),
+            percentile_error=("percentile_error", "mean"),
         )
     )
 
+    # places from sketched standings are only exact in the paid region, so the mean percentile has a bounded error
+    for (run_id, algorithm, contest_type_id), percentile_error in run_summary.percentile_error.items():
+        if percentile_error > 0:
+            logger.info(
+                f"{date:%Y-%m-%d} {algorithm} percentile for contest type {contest_type_id} is within "
+                f"±{percentile_error:.4f}"
+            )
+
     run_summary.insert(0, "date", date)
 
     summary_file = "results/summary.csv"
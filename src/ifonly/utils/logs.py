@@ -0,0 +1,79 @@
+# Logging for every process of a run: processes only put their records on a queue, and a single listener in the main
+# process writes them to the run's log file, so no process waits on file I/O to log
+
+from logging.handlers import MemoryHandler, QueueHandler, QueueListener
+from multiprocessing.queues import Queue
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Iterator, Tuple
+import multiprocessing
+import logging
+
+# the queue of the listener this process (or its parent) started, if any, and the level to log at
+_log_config: Tuple[Any, int | str] = (None, logging.INFO)
+
+
+def get_log_file(log_dir: str | Path, run_id: int) -> Path:
+    return Path(log_dir) / f"{run_id}.log"
+
+
+def configure_worker(log_queue: Any, level: int | str = logging.INFO) -> None:
+    """Sends every record logged in this process to `log_queue`, to be written by the main process's listener"""
+    global _log_config
+    if log_queue is None:
+        return
+
+    _log_config = (log_queue, level)
+    root = logging.getLogger()
+    root.handlers = [QueueHandler(log_queue)]
+    root.setLevel(level)
+
+
+def get_log_config() -> Tuple[Any, int | str]:
+    """Returns the arguments to `configure_worker` a new process is started with, so it logs the same as this one"""
+    return _log_config
+
+
+def run_with_logging(log_config: Tuple[Any, int | str], target: Callable, *args) -> Any:
+    """Configures logging with `log_config` before running `target`, for use as the target of a new process"""
+    configure_worker(*log_config)
+    return target(*args)
+
+
+@contextmanager
+def logging_listener(
+    run_id: int, log_dir: str | Path = "results/logs", level: int | str = logging.INFO, buffer_records: int = 1000
+) -> Iterator[Any]:
+    """
+    Writes the records logged by this process, and every process configured with the yielded queue, to the run's log
+    file for the duration of the context
+
+    Records are written in batches of `buffer_records`, except warnings and errors, which are written straight away
+    (along with everything before them). Listeners can be nested, records go to the innermost one's file until it stops
+    """
+    global _log_config
+    log_file = get_log_file(log_dir, run_id)
+    log_file.parent.mkdir(parents=True, exist_ok=True)
+
+    file_handler = logging.FileHandler(log_file)
+    file_handler.setFormatter(logging.Formatter("%(asctime)s %(processName)s %(name)s %(levelname)s: %(message)s"))
+    buffered_handler = MemoryHandler(buffer_records, flushLevel=logging.WARNING, target=file_handler)
+
+    log_queue: Queue[logging.LogRecord] = multiprocessing.Queue()
+    listener = QueueListener(log_queue, buffered_handler)
+
+    root = logging.getLogger()
+    handlers, root_level, log_config = root.handlers, root.level, _log_config
+    configure_worker(log_queue, level)
+    listener.start()
+
+    try:
+        yield log_queue
+    finally:
+        listener.stop()
+        buffered_handler.close()
+        file_handler.close()
+
+        _log_config = log_config
+        root.handlers = handlers
+        root.setLevel(root_level)
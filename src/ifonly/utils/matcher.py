@@ -4,9 +4,9 @@ from typing import List, Callable
 import logging
 
 logger = logging.getLogger(__name__)
-logging.basicConfig(filename="matcher.log", level=logging.INFO, filemode="w")
 
 MATCH_CUTOFF = 0.7
+LOGGED_MISSES = 5  # the most unmatched names listed in the summary of each call
 
 
 def get_matcher(name: str) -> Callable[[str], float]:
@@ -40,6 +40,9 @@ def approximate_match(source: pd.DataFrame, lookup: pd.DataFrame, what: str, on:
         A series containing the best guesses at the matching rows between `source` and `lookup`
     """
     what_best_guesses = []
+    log_matches = logger.isEnabledFor(logging.DEBUG)
+    misses: List[str] = []
+
     for _, row in source.iterrows():
         # Filter lookup down to only the rows that match each attribute of `row` in `by`
         mask = (lookup.filter(by) == row.filter(by)).all(axis=1)
@@ -47,23 +50,33 @@ def approximate_match(source: pd.DataFrame, lookup: pd.DataFrame, what: str, on:
 
         # make a function that scores how similar a str is to the `on` attribute of `row`
         matcher = get_matcher(row.loc[on])
-        # score each of the remaining entries in lookups
-        match_ratios = lookup_matches.get(on).map(matcher)  # type: ignore
+        # score each of the remaining entries in lookups, as str since mapping a categorical column keeps it categorical
+        match_ratios = lookup_matches[on].astype(str).map(matcher)
 
         # get the `what` value of the closest match in `lookup_matches`
-        try:
-            if match_ratios.max() >= MATCH_CUTOFF:
-                what_best_guess = lookup_matches.iloc[match_ratios.argmax()].get(what)
-                logger.info(f"Matched {row.get("name")} with {lookup_matches.iloc[match_ratios.argmax()].get("name")}")
-            else:
-                what_best_guess = None
-                logger.info(
-                    f"Did not match match {row.get("name")} - Closest was {lookup_matches.iloc[match_ratios.argmax()].get("name")}"
+        if match_ratios.empty:
+            closest = None
+        else:
+            closest = lookup_matches.iloc[match_ratios.argmax()]
+
+        if closest is not None and match_ratios.max() >= MATCH_CUTOFF:
+            what_best_guesses.append(closest.get(what))
+            if log_matches:
+                logger.debug(f"Matched {row.get("name")} with {closest.get("name")}")
+        else:
+            what_best_guesses.append(None)
+            misses.append(row.get("name"))
+            if log_matches:
+                logger.debug(
+                    f"Did not match {row.get("name")} - Closest was {None if closest is None else closest.get("name")}"
                 )
-        except:
-            breakpoint()
-            exit(1)
 
-        what_best_guesses.append(what_best_guess if match_ratios.max() >= MATCH_CUTOFF else None)
+    # per-match lines are only logged when debugging, every call is summarized instead
+    if len(source):
+        summary = f"Approximately matched {len(source) - len(misses)}/{len(source)} rows on {on}"
+        if misses:
+            missed = ", ".join(map(str, misses[:LOGGED_MISSES])) + (", ..." if len(misses) > LOGGED_MISSES else "")
+            summary += f", missed {missed}"
+        logger.info(summary)
 
     return pd.Series(what_best_guesses, index=source.index, dtype=lookup.dtypes.get(what))  # type: ignore
@@ -0,0 +1,65 @@
+import time
+import sys
+import os
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+def get_rss(pid: int) -> int | None:
+    """
+    Returns the resident memory of a process in bytes, or None if it can't be measured
+
+    psutil is used when it's installed, otherwise only Linux (through /proc) is supported
+    """
+    if psutil is not None:
+        try:
+            return psutil.Process(pid).memory_info().rss
+        except psutil.Error:
+            return None
+
+    if not sys.platform.startswith("linux"):
+        return None
+
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+
+    return None
+
+
+def get_process_age(pid: int) -> float | None:
+    """
+    Returns the seconds since a process started, or None if it can't be measured
+
+    On Linux it's read from /proc to the clock tick (psutil's start times are only accurate to the second there),
+    otherwise psutil is used when it's installed
+    """
+    if sys.platform.startswith("linux"):
+        try:
+            with open(f"/proc/{pid}/stat") as f:
+                # the command name (in parentheses) can hold spaces, the start time is the 20th field after it
+                started = int(f.read().rsplit(")", 1)[1].split()[19])
+            with open("/proc/uptime") as f:
+                uptime = float(f.read().split()[0])
+            return uptime - started / os.sysconf("SC_CLK_TCK")
+        except (OSError, ValueError, IndexError):
+            pass
+
+    if psutil is not None:
+        try:
+            return time.time() - psutil.Process(pid).create_time()
+        except psutil.Error:
+            return None
+
+    return None
+
+
+def format_bytes(num_bytes: float) -> str:
+    return f"{num_bytes / 2**30:.2f} GiB" if num_bytes >= 2**30 else f"{num_bytes / 2**20:.0f} MiB"
@@ -29,8 +29,11 @@ class Printer:
             if msg == "DONE":  # Sentinel to break the loop
                 break
 
-            (date, num) = msg
-            if num == "DONE":
+            date, num = msg
+            if num == "RESET":  # the date was stopped and will be started again
+                progress_bar.update(-worker_statuses[date])
+                worker_statuses[date] = 0
+            elif num == "DONE":
                 diff = 1 - worker_statuses[date]
                 worker_statuses[date] += diff
                 progress_bar.update(diff)